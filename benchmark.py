@@ -0,0 +1,246 @@
+import os
+import sys
+import time
+import cv2
+
+from video_utils import SequentialFrameReader
+import create_synthetic_data as synth
+
+"""
+================================================================
+SCRIPT DI BENCHMARK DELLA PIPELINE
+================================================================
+
+Obiettivo:
+Misurare le prestazioni delle fasi più costose della pipeline sui dati sintetici
+generati da 'create_synthetic_data.py'.
+
+Come usarlo:
+1. Esegui 'create_synthetic_data.py' (crea la cartella 'synthetic_data').
+2. Esegui questo script: 'python benchmark.py [nome_benchmark ...]'.
+   Senza argomenti vengono eseguiti tutti i benchmark disponibili.
+"""
+
+VIDEO_PATH = os.path.join(synth.INPUT_DIR, "video.mp4")
+
+
+def _report(label, n_frames, elapsed):
+    fps = n_frames / elapsed if elapsed > 0 else float('inf')
+    print(f"  - {label:<40} {n_frames:>6} frame in {elapsed:7.2f} s  ->  {fps:8.1f} frame/s")
+    return fps
+
+
+def benchmark_decode(video_path=VIDEO_PATH):
+    """Confronta la lettura con seek per ogni frame e la lettura sequenziale per segmento."""
+    print("\n--- Benchmark: decodifica video (seek per frame vs lettura sequenziale) ---")
+    segments = [(synth.FAST_START_FRAME, synth.FAST_END_FRAME), (synth.SLOW_START_FRAME, synth.SLOW_END_FRAME)]
+    n_frames = sum(end - start for start, end in segments)
+
+    # 1. Metodo originale: seek prima di ogni lettura
+    cap = cv2.VideoCapture(video_path)
+    t_start = time.perf_counter()
+    for start, end in segments:
+        for frame_idx in range(start, end):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+            cap.read()
+    seek_fps = _report("Seek per ogni frame", n_frames, time.perf_counter() - t_start)
+    cap.release()
+
+    # 2. Lettore sequenziale: un solo seek per segmento
+    with SequentialFrameReader(video_path) as reader:
+        t_start = time.perf_counter()
+        for start, end in segments:
+            for frame_idx in range(start, end):
+                reader.read(frame_idx)
+        seq_fps = _report("Lettura sequenziale", n_frames, time.perf_counter() - t_start)
+        print(f"    (seek eseguiti: {reader.seek_count})")
+
+    print(f"  => Speedup: {seq_fps / seek_fps:.1f}x")
+
+
+def _read_frames(video_path, start_frame, n_frames):
+    frames = []
+    with SequentialFrameReader(video_path) as reader:
+        for frame_idx in range(start_frame, start_frame + n_frames):
+            ret, frame = reader.read(frame_idx)
+            if not ret:
+                break
+            frames.append(frame)
+    return frames
+
+
+def benchmark_yolo(video_path=VIDEO_PATH, model_path='yolov8n.pt', n_frames=128, batch_sizes=(4, 8, 16)):
+    """Confronta YOLO frame per frame con l'inferenza a batch (CPU)."""
+    print("\n--- Benchmark: YOLO frame per frame vs inferenza a batch (CPU) ---")
+    from ultralytics import YOLO
+    import detect_and_save_ball
+
+    model = YOLO(model_path)
+    model.to('cpu')
+    classes = model.names
+    sports_ball_class_id = list(classes.keys())[list(classes.values()).index('sports ball')]
+    frames = _read_frames(video_path, synth.FAST_START_FRAME, n_frames)
+
+    # Riscaldamento: la prima chiamata include l'inizializzazione del modello
+    model(frames[0], verbose=False)
+
+    t_start = time.perf_counter()
+    for frame in frames:
+        detect_and_save_ball.detect_ball_yolo(frame, model, sports_ball_class_id)
+    single_fps = _report("Frame per frame", len(frames), time.perf_counter() - t_start)
+
+    for batch_size in batch_sizes:
+        t_start = time.perf_counter()
+        for i in range(0, len(frames), batch_size):
+            detect_and_save_ball.detect_ball_yolo_batch(frames[i:i + batch_size], model, sports_ball_class_id)
+        batch_fps = _report(f"Batch da {batch_size}", len(frames), time.perf_counter() - t_start)
+        print(f"    => Speedup: {batch_fps / single_fps:.1f}x")
+
+
+def benchmark_downscale(video_path=VIDEO_PATH, scales=(0.75, 0.5), n_frames=600):
+    """
+    Confronta il rilevamento Hough a piena risoluzione con quello su frame raddrizzati
+    a risoluzione ridotta: velocità ed errore del centro/bbox riportati a piena risoluzione.
+    """
+    print("\n--- Benchmark: rilevamento Hough a risoluzione ridotta (velocità e accuratezza) ---")
+    import numpy as np
+    import detect_and_save_ball
+    from video_utils import HomographyCache
+
+    frames = _read_frames(video_path, synth.FAST_START_FRAME, n_frames)
+    output_size = (synth.WIDTH, synth.HEIGHT)
+    src_pts = np.array([[0, 0], [synth.WIDTH, 0], [synth.WIDTH, synth.HEIGHT], [0, synth.HEIGHT]], dtype=np.float32)
+
+    def run(detection_size):
+        homography = HomographyCache(detection_size)
+        hough_params = detect_and_save_ball.find_optimal_hough_params(homography.warp(frames[0], src_pts))
+        centers, bboxes = [], []
+        t_start = time.perf_counter()
+        for frame in frames:
+            warped = homography.warp(frame, src_pts)
+            bbox, x, y = detect_and_save_ball.detect_ball_hough(warped, hough_params)
+            bbox = detect_and_save_ball.scale_bbox_to_output(bbox, detection_size, output_size)
+            centers.append((np.nan, np.nan) if x is None else (x, y))
+            bboxes.append((np.nan,) * 4 if bbox is None else bbox)
+        return np.array(centers, dtype=float), np.array(bboxes, dtype=float), time.perf_counter() - t_start
+
+    ref_centers, ref_bboxes, ref_elapsed = run(output_size)
+    ref_fps = _report("Piena risoluzione", len(frames), ref_elapsed)
+
+    for scale in scales:
+        detection_size = detect_and_save_ball.get_detection_size(output_size, scale)
+        centers, bboxes, elapsed = run(detection_size)
+        fps = _report(f"Scala {scale:.2f} ({detection_size[0]}x{detection_size[1]})", len(frames), elapsed)
+        both = ~np.isnan(ref_centers[:, 0]) & ~np.isnan(centers[:, 0])
+        center_err_px = np.hypot((centers[both, 0] - ref_centers[both, 0]) * synth.WIDTH,
+                                 (centers[both, 1] - ref_centers[both, 1]) * synth.HEIGHT)
+        size_err_px = np.abs(bboxes[both, 2] - ref_bboxes[both, 2])
+        agreement = (np.isnan(ref_centers[:, 0]) == np.isnan(centers[:, 0])).mean() * 100
+        print(f"    => Speedup: {fps / ref_fps:.1f}x | concordanza rilevamenti: {agreement:.1f}% | "
+              f"errore centro: medio {center_err_px.mean():.2f} px, max {center_err_px.max():.2f} px | "
+              f"errore diametro: medio {size_err_px.mean():.2f} px")
+
+
+def benchmark_alignment(hours=3, gaze_hz=200, world_fps=30, tolerance_ms=20):
+    """
+    Confronta l'allineamento sguardo/frame con pd.merge_asof su datetime (metodo originale)
+    e quello con np.searchsorted su int64, su un flusso di sguardo sintetico a 200 Hz di più ore.
+    """
+    print(f"\n--- Benchmark: allineamento timestamp ({hours} h, sguardo a {gaze_hz} Hz) ---")
+    import tempfile
+    import numpy as np
+    import pandas as pd
+    import detect_and_save_ball
+
+    rng = np.random.default_rng(0)
+    duration_ns = int(hours * 3600 * 1e9)
+    world_ns = np.arange(0, duration_ns, int(1e9 / world_fps), dtype=np.int64)
+    # Campionamento con jitter e qualche buco, come in una registrazione reale
+    gaze_ns = np.arange(0, duration_ns, int(1e9 / gaze_hz), dtype=np.int64)
+    gaze_ns = np.sort(gaze_ns + rng.integers(-1_000_000, 1_000_000, len(gaze_ns)))
+    n_gaze = len(gaze_ns)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        world_path = os.path.join(tmp_dir, 'world_timestamps.csv')
+        gaze_path = os.path.join(tmp_dir, 'gaze.csv')
+        pd.DataFrame({'world_index': np.arange(len(world_ns)), 'timestamp [ns]': world_ns}).to_csv(world_path, index=False)
+        pd.DataFrame({
+            'section id': 'benchmark', 'recording id': 'benchmark', 'timestamp [ns]': gaze_ns,
+            'gaze x [px]': rng.random(n_gaze) * 1600, 'gaze y [px]': rng.random(n_gaze) * 1200,
+            'worn': 1, 'fixation id': np.nan, 'blink id': np.nan,
+            'gaze detected on surface': rng.random(n_gaze) > 0.1,
+            'gaze position on surface x [normalized]': rng.random(n_gaze),
+            'gaze position on surface y [normalized]': rng.random(n_gaze),
+        }).to_csv(gaze_path, index=False)
+        print(f"  ({len(world_ns)} frame, {n_gaze} campioni di sguardo)")
+
+        # 1. Metodo originale: lettura completa, datetime64 e merge_asof
+        t_start = time.perf_counter()
+        world = pd.read_csv(world_path).rename(columns={'timestamp [ns]': 'world_timestamp_ns'})
+        gaze = pd.read_csv(gaze_path)
+        gaze = gaze[gaze['gaze detected on surface'] == True].rename(columns={'timestamp [ns]': 'gaze_timestamp_ns'})
+        world['world_timestamp_dt'] = pd.to_datetime(world['world_timestamp_ns'], unit='ns')
+        gaze['gaze_timestamp_dt'] = pd.to_datetime(gaze['gaze_timestamp_ns'], unit='ns')
+        reference = pd.merge_asof(world.sort_values('world_timestamp_dt'), gaze.sort_values('gaze_timestamp_dt'),
+                                  left_on='world_timestamp_dt', right_on='gaze_timestamp_dt',
+                                  direction='nearest', tolerance=pd.Timedelta(f'{tolerance_ms}ms'))
+        merge_fps = _report("merge_asof su datetime", len(world_ns), time.perf_counter() - t_start)
+
+        # 2. Allineamento vettoriale su int64
+        t_start = time.perf_counter()
+        aligned = detect_and_save_ball.align_timestamps_and_filter(world_path, gaze_path)
+        fast_fps = _report("searchsorted su int64", len(world_ns), time.perf_counter() - t_start)
+
+    same = np.array_equal(reference['gaze position on surface x [normalized]'].to_numpy(),
+                          aligned['gaze_x_norm'].to_numpy(), equal_nan=True)
+    print(f"  => Speedup: {fast_fps / merge_fps:.1f}x | risultati identici: {'sì' if same else 'NO'}")
+
+
+def benchmark_ocr(video_path=VIDEO_PATH, n_frames=96, batch_sizes=(4, 8, 16)):
+    """Confronta l'OCR con le tre pipeline distribuite su thread e l'OCR a batch di 'trim_video'."""
+    print("\n--- Benchmark: OCR con executor a 3 thread vs OCR a batch (CPU) ---")
+    import concurrent.futures
+    import easyocr
+    import trim_video
+
+    reader = easyocr.Reader(['en'], gpu=False)
+    # Frame a cavallo della scomparsa del numero '1', così il batch contiene frame con e senza testo
+    start_frame = max(0, synth.FAST_TEXT_FRAME_END - n_frames // 2)
+    frames = _read_frames(video_path, start_frame, n_frames)
+
+    # Riscaldamento: la prima chiamata include l'inizializzazione dei modelli
+    trim_video.detect_text_ocr(frames[0], reader, '1')
+
+    t_start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+        expected = [trim_video.detect_text_ocr(frame, reader, '1', executor) for frame in frames]
+    executor_fps = _report("Executor a 3 thread", len(frames), time.perf_counter() - t_start)
+
+    for batch_size in batch_sizes:
+        t_start = time.perf_counter()
+        results = []
+        for i in range(0, len(frames), batch_size):
+            results += trim_video.detect_text_ocr_batch(frames[i:i + batch_size], reader, '1')
+        batch_fps = _report(f"Batch da {batch_size} frame", len(frames), time.perf_counter() - t_start)
+        print(f"    => Speedup: {batch_fps / executor_fps:.1f}x | risultati identici: {'sì' if results == expected else 'NO'}")
+
+
+BENCHMARKS = {
+    'decode': benchmark_decode,
+    'yolo': benchmark_yolo,
+    'downscale': benchmark_downscale,
+    'alignment': benchmark_alignment,
+    'ocr': benchmark_ocr,
+}
+
+if __name__ == "__main__":
+    if not os.path.exists(VIDEO_PATH):
+        print(f"ERRORE: Video sintetico non trovato in '{VIDEO_PATH}'. Esegui prima 'create_synthetic_data.py'.")
+        sys.exit(1)
+
+    selected = sys.argv[1:] or list(BENCHMARKS.keys())
+    for name in selected:
+        if name not in BENCHMARKS:
+            print(f"ATTENZIONE: Benchmark sconosciuto '{name}'. Disponibili: {list(BENCHMARKS.keys())}")
+            continue
+        BENCHMARKS[name]()
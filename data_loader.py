@@ -0,0 +1,197 @@
+import os
+import re
+import csv
+import numpy as np
+import pandas as pd
+
+# Il parser pyarrow è molto più veloce su file grandi; se non è installato si usa quello di pandas
+# (e la cache binaria passa da Feather a pickle)
+try:
+    import pyarrow as pa
+    CSV_ENGINE = 'pyarrow'
+except ImportError:
+    pa = None
+    CSV_ENGINE = 'c'
+
+"""
+Lettura tipizzata e condivisa dei file esportati da Pupil Labs (gaze.csv, 3d_eye_states.csv,
+world_timestamps.csv, surface_positions.csv).
+
+Ogni funzione legge solo le colonne necessarie con tipi fissi, normalizza le varianti dei nomi
+di colonna e memorizza la tabella letta: i moduli della pipeline che leggono lo stesso file
+nella stessa esecuzione non lo rianalizzano (la GUI svuota questa memoria con clear_cache() al
+termine di ogni analisi). La memoria è indicizzata anche per dimensione e data
+di modifica, quindi un file riscritto viene riletto automaticamente.
+
+Le tabelle lette vengono salvate anche in una cache binaria (Feather, o pickle senza pyarrow)
+nella sottocartella 'binary_cache' accanto ai CSV: le analisi successive dello stesso soggetto
+caricano direttamente la versione binaria, mappata in memoria, senza rianalizzare il testo.
+"""
+
+SURFACE_CORNER_COLUMNS = [f'{corner} {axis} [px]' for corner in ('tl', 'tr', 'br', 'bl') for axis in ('x', 'y')]
+
+BINARY_CACHE_DIRNAME = 'binary_cache'
+
+_TABLE_CACHE = {}
+
+
+def clear_cache():
+    _TABLE_CACHE.clear()
+
+
+def clean_pupil_column_name(name):
+    """Stessa pulizia dei nomi usata storicamente per le colonne di 3d_eye_states.csv."""
+    return re.sub(r'[^a-zA-Z0-9_\[\]]', '', name).strip()
+
+
+def read_header(path):
+    with open(path, newline='') as f:
+        return next(csv.reader(f), [])
+
+
+def _binary_cache_path(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    extension = '.feather' if pa is not None else '.pkl'
+    return os.path.join(os.path.dirname(os.path.abspath(path)), BINARY_CACHE_DIRNAME, name + extension)
+
+
+def _source_signature(stat, columns):
+    return {'source_size': str(stat.st_size), 'source_mtime_ns': str(stat.st_mtime_ns), 'columns': '|'.join(columns)}
+
+
+def _read_binary_cache(path, signature):
+    """Ritorna la tabella dalla cache binaria se è stata creata dalla stessa versione del CSV, altrimenti None."""
+    cache_path = _binary_cache_path(path)
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        if pa is not None:
+            # La mappa in memoria resta aperta finché pandas usa i buffer letti
+            reader = pa.ipc.open_file(pa.memory_map(cache_path))
+            metadata = {k.decode(): v.decode() for k, v in (reader.schema.metadata or {}).items()}
+            if any(metadata.get(k) != v for k, v in signature.items()):
+                return None
+            return reader.read_all().to_pandas()
+        cached = pd.read_pickle(cache_path)
+        return cached['table'] if cached['signature'] == signature else None
+    except Exception as e:
+        print(f"ATTENZIONE: Cache binaria '{cache_path}' illeggibile ({e}). Rileggo il CSV.")
+        return None
+
+
+def _write_binary_cache(path, signature, table):
+    if table.shape[1] == 0:
+        return
+    cache_path = _binary_cache_path(path)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = cache_path + '.tmp'
+        if pa is not None:
+            arrow_table = pa.Table.from_pandas(table, preserve_index=False)
+            arrow_table = arrow_table.replace_schema_metadata(
+                dict(arrow_table.schema.metadata or {}, **signature))
+            with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, arrow_table.schema) as writer:
+                writer.write_table(arrow_table)
+        else:
+            pd.to_pickle({'signature': signature, 'table': table}, tmp_path)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"ATTENZIONE: Impossibile scrivere la cache binaria per '{path}' ({e}).")
+
+
+def _read_columns(path, columns, dtypes=None):
+    """
+    Legge da `path` le colonne `columns` presenti nel file (nomi confrontati senza spazi
+    iniziali/finali) con i tipi indicati in `dtypes`, preferendo la cache binaria se aggiornata.
+    Ritorna una copia della tabella memorizzata.
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, tuple(columns))
+    if key not in _TABLE_CACHE:
+        signature = _source_signature(stat, columns)
+        table = _read_binary_cache(path, signature)
+        if table is None:
+            header = {name.strip(): name for name in read_header(path)}
+            usecols = [header[name] for name in columns if name in header]
+            dtype = {header[name]: t for name, t in (dtypes or {}).items() if name in header}
+            table = pd.read_csv(path, usecols=usecols or [0], dtype=dtype, engine=CSV_ENGINE)
+            if not usecols:
+                table = table.iloc[:, :0]  # Nessuna colonna richiesta presente: conserva solo il numero di righe
+            table.columns = [name.strip() for name in table.columns]
+            _write_binary_cache(path, signature, table)
+        _TABLE_CACHE[key] = table
+    return _TABLE_CACHE[key].copy()
+
+
+def load_world_timestamps(path):
+    """
+    Timestamp dei frame del video: colonne 'world_index' (da '# frame_idx', 'world_index' o,
+    in mancanza, dalla posizione della riga) e 'world_timestamp_ns'.
+    """
+    table = _read_columns(path, ['# frame_idx', 'world_index', 'timestamp [ns]'],
+                          {'# frame_idx': 'int64', 'world_index': 'int64', 'timestamp [ns]': 'int64'})
+    if '# frame_idx' in table.columns:
+        table = table.drop(columns=['world_index'], errors='ignore').rename(columns={'# frame_idx': 'world_index'})
+    elif 'world_index' not in table.columns:
+        table['world_index'] = np.arange(len(table), dtype=np.int64)
+    return table.rename(columns={'timestamp [ns]': 'world_timestamp_ns'})
+
+
+def load_gaze(path):
+    """
+    Dati di sguardo: 'gaze_timestamp_ns' (anche da 'timestamp [s]'), 'gaze_on_surface' (bool),
+    'gaze_x_norm' e 'gaze_y_norm' (coordinate normalizzate sulla superficie).
+    """
+    table = _read_columns(
+        path,
+        ['timestamp [ns]', 'timestamp [s]', 'gaze detected on surface',
+         'gaze position on surface x [normalized]', 'gaze position on surface y [normalized]'],
+        {'timestamp [ns]': 'int64', 'timestamp [s]': 'float64',
+         'gaze position on surface x [normalized]': 'float64', 'gaze position on surface y [normalized]': 'float64'})
+    if 'timestamp [ns]' in table.columns:
+        table = table.rename(columns={'timestamp [ns]': 'gaze_timestamp_ns'}).drop(columns=['timestamp [s]'], errors='ignore')
+    elif 'timestamp [s]' in table.columns:
+        table['gaze_timestamp_ns'] = (table.pop('timestamp [s]') * 1e9).astype('int64')
+    table['gaze_on_surface'] = (table.pop('gaze detected on surface') == True) \
+        if 'gaze detected on surface' in table.columns else False
+    return table.rename(columns={'gaze position on surface x [normalized]': 'gaze_x_norm',
+                                 'gaze position on surface y [normalized]': 'gaze_y_norm'})
+
+
+def load_surface_positions(path):
+    """Angoli della superficie per frame: 'world_index' e le colonne '<angolo> <asse> [px]'."""
+    table = _read_columns(path, ['world_index'] + SURFACE_CORNER_COLUMNS,
+                          dict({'world_index': 'int64'}, **{name: 'float64' for name in SURFACE_CORNER_COLUMNS}))
+    if 'world_index' not in table.columns:
+        table['world_index'] = np.arange(len(table), dtype=np.int64)
+    return table
+
+
+def load_eye_states(path):
+    """
+    Stati oculari 3D: 'pupil_timestamp_ns' e le colonne del diametro pupillare con i nomi
+    ripuliti da `clean_pupil_column_name` (es. 'pupildiameterleft[mm]').
+    """
+    pupil_columns = [name.strip() for name in read_header(path) if 'pupil diameter' in name]
+    table = _read_columns(path, ['timestamp [ns]'] + pupil_columns,
+                          dict({'timestamp [ns]': 'int64'}, **{name: 'float64' for name in pupil_columns}))
+    table = table.rename(columns={'timestamp [ns]': 'pupil_timestamp_ns'})
+    table.columns = [name if name == 'pupil_timestamp_ns' else clean_pupil_column_name(name) for name in table.columns]
+    return table
+
+
+LOADERS = {
+    'world_timestamps.csv': load_world_timestamps,
+    'gaze.csv': load_gaze,
+    'surface_positions.csv': load_surface_positions,
+    '3d_eye_states.csv': load_eye_states,
+}
+
+
+def build_binary_cache(input_dir):
+    """Converte in anticipo i CSV presenti in `input_dir` nella cache binaria."""
+    for filename, loader in LOADERS.items():
+        path = os.path.join(input_dir, filename)
+        if os.path.exists(path):
+            loader(path)
+            print(f"✅ Cache binaria pronta per '{filename}'")
@@ -3,19 +3,74 @@ import numpy as np
 import pandas as pd
 import os
 import sys
-from ultralytics import YOLO
+import concurrent.futures
+import multiprocessing
+from video_utils import SequentialFrameReader, HomographyCache
+from result_writer import StreamingResultWriter
+from pipeline_cache import DetectionCheckpoint, file_fingerprint
+from timestamp_utils import match_nearest_timestamps
+import data_loader
+import model_registry
+from interval_utils import assign_intervals
+
+# Colonne (e tipi) del file output_final_analysis_analysis.csv. I box allargati restano float64, come
+# nella scrittura originale in un unico DataFrame (con frame senza rilevamento: '12.0,,').
+RESULT_COLUMNS = {
+    'frame': 'int64', 'ball_center_x_norm': 'float64', 'ball_center_y_norm': 'float64',
+    'ball_w_norm': 'float64', 'ball_h_norm': 'float64', 'gaze_x_norm': 'float64',
+    'gaze_y_norm': 'float64', 'gaze_in_box': 'bool',
+    'enlarged_bbox_x': 'float64', 'enlarged_bbox_y': 'float64', 'enlarged_bbox_w': 'float64', 'enlarged_bbox_h': 'float64',
+    'segment_name': 'object',
+}
+
+# --- Memoizzazione dei parametri di Hough ---
+# I trial di una stessa registrazione mostrano la stessa scena (sfondo, palla, dimensioni della
+# superficie): la ricerca su griglia viene eseguita solo se non esiste già un risultato per una
+# scena equivalente, riconosciuta tramite dimensioni del frame e istogramma dei grigi.
+# La cache vale per una sola esecuzione di main(), che la svuota all'avvio.
+_HOUGH_PARAMS_CACHE = []  # Lista di (shape, istogramma normalizzato, parametri)
+_HOUGH_CACHE_MAX_ENTRIES = 32
+_HOUGH_SIGNATURE_TOLERANCE = 0.02  # Distanza L1 massima tra istogrammi normalizzati
+
+def compute_frame_signature(gray_frame):
+    """Firma economica di un frame: istogramma a 32 livelli, normalizzato."""
+    hist = cv2.calcHist([gray_frame], [0], None, [32], [0, 256]).ravel()
+    return hist / max(hist.sum(), 1.0)
+
+def _hough_detects_single_circle(gray_frame, height, params):
+    circles = cv2.HoughCircles(gray_frame, cv2.HOUGH_GRADIENT, dp=1.2,
+                               minDist=height, # Assicura di trovare al massimo un cerchio
+                               param1=params['param1'], param2=params['param2'],
+                               minRadius=params['minRadius'], maxRadius=params['maxRadius'])
+    if circles is None:
+        return False, 0
+    return len(circles[0]) == 1, len(circles[0])
+
+def clear_hough_params_cache():
+    _HOUGH_PARAMS_CACHE.clear()
 
 # --- NUOVA FUNZIONE: Esegue un Grid Search per i parametri di Hough ---
-def find_optimal_hough_params(sample_frame):
+def find_optimal_hough_params(sample_frame, use_cache=True):
     """
     Esegue una ricerca su una griglia di parametri per trovare la combinazione ottimale
     che rileva esattamente un cerchio in un frame di esempio.
+    Se una scena equivalente è già stata analizzata, i suoi parametri vengono riusati
+    (dopo una singola verifica sul frame corrente) senza ripetere la ricerca.
     """
-    print("INFO: Avvio ricerca parametri ottimali per Hough Circle...")
     gray_frame = cv2.cvtColor(sample_frame, cv2.COLOR_BGR2GRAY)
     gray_frame = cv2.GaussianBlur(gray_frame, (9, 9), 2)
     height, width, _ = sample_frame.shape
 
+    signature = compute_frame_signature(gray_frame) if use_cache else None
+    if use_cache:
+        for shape, cached_signature, cached_params in _HOUGH_PARAMS_CACHE:
+            if shape == (height, width) and np.abs(cached_signature - signature).sum() <= _HOUGH_SIGNATURE_TOLERANCE:
+                if _hough_detects_single_circle(gray_frame, height, cached_params)[0]:
+                    print(f"INFO: Scena equivalente già analizzata, riuso i parametri Hough: {cached_params}")
+                    return cached_params
+
+    print("INFO: Avvio ricerca parametri ottimali per Hough Circle...")
+
     # 1. Definiamo la griglia di ricerca
     param1_values = [70, 50, 40, 30]  # Soglia Canny (da alta a bassa)
     param2_values = [40, 30, 20, 15]  # Accumulatore (da severo a permissivo)
@@ -25,23 +80,35 @@ def find_optimal_hough_params(sample_frame):
         (0.10, 0.20)   # Range "grande"
     ]
 
-    # 2. Iteriamo sulla griglia per trovare la prima combinazione valida
+    # 2. Iteriamo sulla griglia per trovare la prima combinazione valida.
+    # L'immagine pre-elaborata (grigio + blur) viene calcolata una sola volta per tutta la griglia.
     for p1 in param1_values:
+        # HoughCircles applica internamente Canny(param1 / 2, param1): se con questa soglia
+        # non ci sono bordi, nessuna combinazione con questo param1 può trovare un cerchio.
+        if cv2.countNonZero(cv2.Canny(gray_frame, max(1, p1 // 2), p1)) == 0:
+            continue
+
+        # I valori di param2 sono ordinati da severo a permissivo: se un range di raggi
+        # produce già più di un cerchio con una soglia severa, le soglie più permissive
+        # ne producono in pratica almeno altrettanti, quindi quel range viene escluso.
+        crowded_ranges = set()
         for p2 in param2_values:
             for r_min_perc, r_max_perc in radius_ranges_perc:
-                min_r = int(height * r_min_perc)
-                max_r = int(height * r_max_perc)
-                
-                circles = cv2.HoughCircles(gray_frame, cv2.HOUGH_GRADIENT, dp=1.2, 
-                                           minDist=height, # Assicura di trovare al massimo un cerchio
-                                           param1=p1, param2=p2,
-                                           minRadius=min_r, maxRadius=max_r)
-                
-                if circles is not None and len(circles[0]) == 1:
+                if (r_min_perc, r_max_perc) in crowded_ranges:
+                    continue
+                params = {'param1': p1, 'param2': p2,
+                          'minRadius': int(height * r_min_perc), 'maxRadius': int(height * r_max_perc)}
+                is_single, n_circles = _hough_detects_single_circle(gray_frame, height, params)
+
+                if is_single:
                     # Successo! Trovata una combinazione che rileva un solo cerchio.
-                    optimal_params = {'param1': p1, 'param2': p2, 'minRadius': min_r, 'maxRadius': max_r}
-                    print(f"✅ Parametri ottimali trovati: {optimal_params}")
-                    return optimal_params
+                    print(f"✅ Parametri ottimali trovati: {params}")
+                    if use_cache:
+                        _HOUGH_PARAMS_CACHE.append(((height, width), signature, params))
+                        del _HOUGH_PARAMS_CACHE[:-_HOUGH_CACHE_MAX_ENTRIES]
+                    return params
+                if n_circles > 1:
+                    crowded_ranges.add((r_min_perc, r_max_perc))
 
     # 3. Se nessuna combinazione ha funzionato, ritorniamo un default e avvisiamo l'utente
     print("⚠️ ATTENZIONE: Nessuna combinazione di parametri ha prodotto un risultato ottimale. Uso i default.")
@@ -81,6 +148,34 @@ def detect_ball_yolo(frame, model, sports_ball_class_id):
         return ball_bbox, norm_ball_x, norm_ball_y
     return None, None, None
 
+def detect_ball_yolo_batch(frames, model, sports_ball_class_id, conf_threshold=0.5):
+    """
+    Esegue YOLO su un batch di frame con una sola chiamata al modello.
+    Per ogni immagine seleziona la 'sports ball' con confidenza massima usando operazioni
+    sui tensori (filtro per classe + argmax sulla confidenza), senza cicli sui box.
+    Ritorna due array: bbox (N, 4) in pixel [x, y, w, h] e centri normalizzati (N, 2),
+    con NaN per i frame senza rilevamento valido.
+    """
+    bboxes = np.full((len(frames), 4), np.nan)
+    centers = np.full((len(frames), 2), np.nan)
+    if not frames:
+        return bboxes, centers
+
+    results = model(list(frames), verbose=False)
+    for i, r in enumerate(results):
+        data = r.boxes.data  # (n_box, 6): x1, y1, x2, y2, conf, cls
+        if data.shape[0] == 0:
+            continue
+        conf = data[:, 4].masked_fill(data[:, 5] != sports_ball_class_id, -1.0)
+        best = int(conf.argmax())
+        if float(conf[best]) <= conf_threshold:
+            continue
+        x1, y1, x2, y2 = data[best, :4].tolist()
+        h_frame, w_frame = frames[i].shape[:2]
+        bboxes[i] = (int(x1), int(y1), int(x2 - x1), int(y2 - y1))
+        centers[i] = ((x1 + (x2 - x1) / 2) / w_frame, (y1 + (y2 - y1) / 2) / h_frame)
+    return bboxes, centers
+
 # --- MODIFICA: La funzione ora accetta un dizionario di parametri ---
 def detect_ball_hough(frame, hough_params):
     """
@@ -108,43 +203,443 @@ def detect_ball_hough(frame, hough_params):
         return ball_bbox, norm_ball_x, norm_ball_y
     return None, None, None
 
+class BallTracker:
+    """
+    Tracker a velocità costante per restringere la ricerca della palla.
+
+    Dalle ultime due rilevazioni stima la posizione attesa nel frame successivo e propone
+    una finestra di ricerca centrata sulla previsione, ampia `window_factor` volte il
+    diametro della palla più lo spostamento previsto. Dopo un mancato rilevamento il
+    tracker si azzera e il frame successivo viene cercato sull'intero frame.
+    """
+
+    def __init__(self, window_factor=3.0):
+        self.window_factor = window_factor
+        self.last_center = None
+        self.velocity = np.zeros(2)
+        self.last_size = 0.0
+        self.window_hits = 0
+        self.full_searches = 0
+
+    def reset(self):
+        self.last_center = None
+        self.velocity = np.zeros(2)
+
+    def search_window(self, frame_shape):
+        """Ritorna (x0, y0, x1, y1) della finestra di ricerca, o None se serve una ricerca completa."""
+        if self.last_center is None:
+            return None
+        h_frame, w_frame = frame_shape[:2]
+        cx, cy = self.last_center + self.velocity
+        half = self.last_size * self.window_factor / 2 + np.abs(self.velocity).max()
+        x0, y0 = max(0, int(cx - half)), max(0, int(cy - half))
+        x1, y1 = min(w_frame, int(cx + half) + 1), min(h_frame, int(cy + half) + 1)
+        if x1 - x0 < self.last_size or y1 - y0 < self.last_size:
+            return None  # Previsione fuori dal frame: meglio una ricerca completa
+        return x0, y0, x1, y1
+
+    def update(self, ball_bbox):
+        if ball_bbox is None:
+            self.reset()
+            return
+        x, y, w, h = ball_bbox
+        center = np.array([x + w / 2, y + h / 2], dtype=float)
+        self.velocity = center - self.last_center if self.last_center is not None else np.zeros(2)
+        self.last_center = center
+        self.last_size = float(max(w, h))
+
+    def stats_message(self, label):
+        total = self.window_hits + self.full_searches
+        perc = self.window_hits / total * 100 if total else 0.0
+        return (f"INFO: Tracker palla '{label}': {perc:.1f}% dei frame cercati in finestra "
+                f"({self.window_hits} in finestra, {self.full_searches} sull'intero frame).")
+
+def detect_ball_tracked(frame, detect_fn, tracker):
+    """
+    Rileva la palla cercando prima nella finestra prevista dal tracker e, in caso di
+    mancato rilevamento, sull'intero frame. `detect_fn(frame)` deve restituire
+    (bbox, norm_x, norm_y) come le funzioni detect_ball_*.
+    """
+    window = tracker.search_window(frame.shape)
+    if window is not None:
+        x0, y0, x1, y1 = window
+        ball_bbox, norm_x, norm_y = detect_fn(frame[y0:y1, x0:x1])
+        if ball_bbox is not None:
+            tracker.window_hits += 1
+            h_frame, w_frame = frame.shape[:2]
+            bx, by, bw, bh = ball_bbox
+            ball_bbox = (bx + x0, by + y0, bw, bh)
+            norm_x = (norm_x * (x1 - x0) + x0) / w_frame
+            norm_y = (norm_y * (y1 - y0) + y0) / h_frame
+            tracker.update(ball_bbox)
+            return ball_bbox, norm_x, norm_y
+
+    tracker.full_searches += 1
+    ball_bbox, norm_x, norm_y = detect_fn(frame)
+    tracker.update(ball_bbox)
+    return ball_bbox, norm_x, norm_y
+
+GAZE_ALIGNMENT_TOLERANCE_NS = 20_000_000  # 20 ms
+
 def align_timestamps_and_filter(world_timestamps_path, gaze_data_path):
+    """
+    Associa a ogni frame del video il campione di sguardo sulla superficie più vicino nel tempo
+    (entro 20 ms). Legge solo le colonne necessarie e lavora su timestamp int64 in nanosecondi.
+    """
     print("Allineamento dei timestamp...")
-    world_timestamps = pd.read_csv(world_timestamps_path)
-    if '# frame_idx' in world_timestamps.columns:
-        world_timestamps.rename(columns={'# frame_idx': 'world_index'}, inplace=True)
-    elif 'world_index' not in world_timestamps.columns:
-        world_timestamps['world_index'] = world_timestamps.index
-
-    gaze = pd.read_csv(gaze_data_path)
-    gaze.rename(columns={'gaze position on surface x [normalized]': 'gaze_x_norm', 'gaze position on surface y [normalized]': 'gaze_y_norm'}, inplace=True)
-    gaze_on_surface = gaze[gaze['gaze detected on surface'] == True].copy()
-
-    if 'timestamp [ns]' in world_timestamps.columns:
-         world_timestamps.rename(columns={'timestamp [ns]': 'world_timestamp_ns'}, inplace=True)
-    if 'timestamp [ns]' in gaze_on_surface.columns:
-        gaze_on_surface.rename(columns={'timestamp [ns]': 'gaze_timestamp_ns'}, inplace=True)
-    elif 'timestamp [s]' in gaze_on_surface.columns:
-        gaze_on_surface['gaze_timestamp_ns'] = (gaze_on_surface['timestamp [s]'] * 1e9).astype('int64')
-
-    world_timestamps['world_timestamp_dt'] = pd.to_datetime(world_timestamps['world_timestamp_ns'], unit='ns')
-    gaze_on_surface['gaze_timestamp_dt'] = pd.to_datetime(gaze_on_surface['gaze_timestamp_ns'], unit='ns')
-
-    world_timestamps.sort_values(by='world_timestamp_dt', inplace=True)
-    gaze_on_surface.sort_values(by='gaze_timestamp_dt', inplace=True)
-
-    aligned_data = pd.merge_asof(
-        world_timestamps, gaze_on_surface,
-        left_on='world_timestamp_dt', right_on='gaze_timestamp_dt',
-        direction='nearest', tolerance=pd.Timedelta('20ms')
-    )
+    world_timestamps = data_loader.load_world_timestamps(world_timestamps_path)
+    world_index = world_timestamps['world_index'].to_numpy()
+    world_ns = world_timestamps['world_timestamp_ns'].to_numpy()
+
+    gaze = data_loader.load_gaze(gaze_data_path)
+    on_surface = gaze['gaze_on_surface'].to_numpy()
+    gaze_ns = gaze['gaze_timestamp_ns'].to_numpy()[on_surface]
+    gaze_xy = gaze[['gaze_x_norm', 'gaze_y_norm']].to_numpy()[on_surface]
+
+    # Ordinamento stabile: a parità di timestamp resta l'ordine del file, come con pandas
+    world_order = np.argsort(world_ns, kind='stable')
+    gaze_order = np.argsort(gaze_ns, kind='stable')
+    world_ns, world_index = world_ns[world_order], world_index[world_order]
+    gaze_ns, gaze_xy = gaze_ns[gaze_order], gaze_xy[gaze_order]
+
+    matches = match_nearest_timestamps(world_ns, gaze_ns, GAZE_ALIGNMENT_TOLERANCE_NS)
+    matched = matches >= 0
+    gaze_timestamp_ns = np.full(len(world_ns), np.nan)
+    gaze_timestamp_ns[matched] = gaze_ns[matches[matched]]
+    aligned_xy = np.full((len(world_ns), 2), np.nan)
+    aligned_xy[matched] = gaze_xy[matches[matched]]
+
+    aligned_data = pd.DataFrame({
+        'world_index': world_index, 'world_timestamp_ns': world_ns, 'gaze_timestamp_ns': gaze_timestamp_ns,
+        'gaze_x_norm': aligned_xy[:, 0], 'gaze_y_norm': aligned_xy[:, 1],
+    })
     print("Allineamento completato.")
     return aligned_data
 
+SURFACE_CORNERS = ['tl', 'tr', 'br', 'bl']
+
+def build_frame_index(aligned_gaze_data, surface_positions):
+    """
+    Pre-indicizza sguardo e superficie in array NumPy contigui indicizzati per world_index,
+    così che l'accesso per frame nel ciclo di rilevamento sia O(1) invece di un filtro booleano.
+    Per ogni world_index viene usata la prima riga disponibile, come nel filtro originale.
+    """
+    gaze_rows = aligned_gaze_data.drop_duplicates('world_index', keep='first')
+    surface_rows = surface_positions.drop_duplicates('world_index', keep='first')
+    gaze_idx = gaze_rows['world_index'].to_numpy(dtype=np.int64)
+    surface_idx = surface_rows['world_index'].to_numpy(dtype=np.int64)
+    n_frames = int(max(gaze_idx.max(initial=-1), surface_idx.max(initial=-1))) + 1
+
+    has_gaze = np.zeros(n_frames, dtype=bool)
+    has_gaze[gaze_idx] = True
+    gaze = np.full((n_frames, 2), np.nan, dtype=np.float64)
+    gaze[gaze_idx] = gaze_rows[['gaze_x_norm', 'gaze_y_norm']].to_numpy(dtype=np.float64)
+    trial_id = np.zeros(n_frames, dtype=np.int64)
+    trial_id[gaze_idx] = gaze_rows['trial_id'].to_numpy(dtype=np.int64)
+    prev_trial_id = np.zeros(n_frames, dtype=np.int64)
+    prev_trial_id[gaze_idx] = gaze_rows['prev_trial_id'].to_numpy(dtype=np.int64)
+
+    corner_cols = [f'{corner} {axis} [px]' for corner in SURFACE_CORNERS for axis in ('x', 'y')]
+    corners = np.full((n_frames, 4, 2), np.nan, dtype=np.float32)
+    corners[surface_idx] = surface_rows[corner_cols].to_numpy(dtype=np.float32).reshape(-1, 4, 2)
+
+    # Stessa validità del controllo originale: riga di sguardo presente e angolo 'tl' valido
+    valid = has_gaze & ~np.isnan(corners[:, 0, :]).any(axis=1)
+
+    return {
+        'n_frames': n_frames, 'valid': valid, 'corners': corners,
+        'gaze': gaze, 'trial_id': trial_id, 'prev_trial_id': prev_trial_id,
+    }
+
+
+def compute_output_size(src_pts):
+    """Calcola larghezza e altezza del frame raddrizzato a partire dai 4 angoli della superficie."""
+    w1 = np.linalg.norm(src_pts[0] - src_pts[1])
+    w2 = np.linalg.norm(src_pts[3] - src_pts[2])
+    h1 = np.linalg.norm(src_pts[0] - src_pts[3])
+    h2 = np.linalg.norm(src_pts[1] - src_pts[2])
+    return int(max(w1, w2)), int(max(h1, h2))
+
+def find_segment_output_size(frame_index, start_frame, end_frame):
+    """Dimensioni di output del segmento, determinate dal primo frame valido (come nel ciclo originale)."""
+    end_frame = min(end_frame, frame_index['n_frames'])
+    for frame_idx in np.flatnonzero(frame_index['valid'][start_frame:end_frame]) + start_frame:
+        output_width, output_height = compute_output_size(frame_index['corners'][frame_idx])
+        if output_width > 0 and output_height > 0:
+            return output_width, output_height
+    return 0, 0
+
+def get_detection_size(output_size, detection_scale):
+    """Dimensioni del frame raddrizzato usato per il rilevamento (scala <= 1 rispetto all'output)."""
+    output_width, output_height = output_size
+    if detection_scale >= 1.0:
+        return output_width, output_height
+    return max(1, int(round(output_width * detection_scale))), max(1, int(round(output_height * detection_scale)))
+
+def scale_bbox_to_output(ball_bbox, detection_size, output_size):
+    """Riporta un bbox (x, y, w, h) dalla risoluzione di rilevamento a quella di output."""
+    if ball_bbox is None or detection_size == output_size:
+        return ball_bbox
+    sx = output_size[0] / detection_size[0]
+    sy = output_size[1] / detection_size[1]
+    x, y, w, h = ball_bbox
+    return (int(round(x * sx)), int(round(y * sy)), int(round(w * sx)), int(round(h * sy)))
+
+def process_frame_range(cap, frame_index, segment_name, start_frame, end_frame, output_size, args, emit,
+                        model=None, sports_ball_class_id=None, hough_params=None,
+                        recompute_hough=True, print_stats=True):
+    """
+    Esegue correzione prospettica e rilevamento della palla sui frame [start_frame, end_frame).
+    Ogni risultato per frame viene passato, in ordine, alla funzione `emit`.
+    Con `recompute_hough=False` si usano sempre i parametri `hough_params` ricevuti (blocchi di
+    un piano di rilevamento, che iniziano già dove i parametri cambiano).
+    Ritorna gli ultimi parametri di Hough usati.
+    """
+    # Il frame viene raddrizzato direttamente alla risoluzione di rilevamento (eventualmente ridotta):
+    # i centri normalizzati non cambiano, i bbox vengono riportati alla risoluzione di output.
+    detection_size = get_detection_size(output_size, getattr(args, 'detection_scale', 1.0))
+    # La matrice di omografia viene riusata finché la superficie resta ferma entro la tolleranza
+    homography = HomographyCache(detection_size,
+                                 tolerance_px=getattr(args, 'homography_tolerance_px', 0.5),
+                                 use_remap=getattr(args, 'use_remap_tables', False))
+    current_hough_params = hough_params
+    # Tracker opzionale (solo Hough): YOLO ridimensiona comunque l'input a una dimensione fissa,
+    # quindi cercare in una finestra non ne ridurrebbe il costo e impedirebbe l'inferenza a batch.
+    tracker = BallTracker(getattr(args, 'tracker_window_factor', 3.0)) if getattr(args, 'use_tracker', False) and not args.use_yolo else None
+
+    # Con YOLO i frame raddrizzati vengono accumulati e analizzati a batch
+    yolo_batch_size = max(1, int(getattr(args, 'yolo_batch_size', 1) or 1))
+    pending = []  # (frame_count, warped_frame, gaze_x_norm, gaze_y_norm)
+
+    def flush_yolo_batch():
+        bboxes, centers = detect_ball_yolo_batch([p[1] for p in pending], model, sports_ball_class_id)
+        for (frame_idx, _, gaze_x, gaze_y), bbox, center in zip(pending, bboxes, centers):
+            ball_bbox = None if np.isnan(bbox[0]) else tuple(int(v) for v in bbox)
+            ball_bbox = scale_bbox_to_output(ball_bbox, detection_size, output_size)
+            emit(build_frame_result(frame_idx, segment_name, ball_bbox, center[0], center[1],
+                                    gaze_x, gaze_y, output_size, args.bbox_padding_factor))
+        pending.clear()
+
+    frame_count = start_frame
+    while frame_count < end_frame:
+        ret, original_frame = cap.read(frame_count)
+        if not ret:
+            print(f"ATTENZIONE: Interruzione anticipata del video prima del frame {end_frame}.")
+            break
+
+        # Salta il frame se mancano dati essenziali (maschera pre-calcolata)
+        if frame_count >= frame_index['n_frames'] or not frame_index['valid'][frame_count]:
+            print(f"INFO: Dati di sguardo o superficie mancanti per il frame {frame_count}. Salto.")
+            frame_count += 1
+            continue
+
+        gaze_x_norm, gaze_y_norm = frame_index['gaze'][frame_count]
+        trial_id = frame_index['trial_id'][frame_count]
+        prev_trial_id = frame_index['prev_trial_id'][frame_count]
+
+        # Tenta di eseguire la correzione della prospettiva
+        try:
+            warped_frame = homography.warp(original_frame, frame_index['corners'][frame_count])
+        except Exception as e:
+            print(f"Errore di elaborazione prospettiva al frame {frame_count}: {e}")
+            frame_count += 1
+            continue
+
+        if args.use_yolo:
+            pending.append((frame_count, warped_frame, gaze_x_norm, gaze_y_norm))
+            if len(pending) >= yolo_batch_size:
+                flush_yolo_batch()
+            frame_count += 1
+            continue
+
+        # Rilevamento della palla con Hough
+        # --- NUOVA LOGICA: Ricalcola i parametri all'inizio di ogni trial ---
+        is_start_of_new_trial = (trial_id > 0 and trial_id != prev_trial_id)
+        if current_hough_params is None or (recompute_hough and is_start_of_new_trial):
+            if is_start_of_new_trial:
+                print(f"INFO: Inizio nuovo trial ({int(trial_id)}). Ricalcolo parametri Hough...")
+            current_hough_params = find_optimal_hough_params(warped_frame)
+            if tracker is not None:
+                tracker.reset()
+
+        if tracker is not None:
+            ball_bbox, norm_ball_x, norm_ball_y = detect_ball_tracked(
+                warped_frame, lambda f: detect_ball_hough(f, current_hough_params), tracker)
+        else:
+            ball_bbox, norm_ball_x, norm_ball_y = detect_ball_hough(warped_frame, current_hough_params)
+        ball_bbox = scale_bbox_to_output(ball_bbox, detection_size, output_size)
+
+        emit(build_frame_result(frame_count, segment_name, ball_bbox, norm_ball_x, norm_ball_y,
+                                gaze_x_norm, gaze_y_norm, output_size, args.bbox_padding_factor))
+        frame_count += 1
+
+    if pending:
+        flush_yolo_batch()
+
+    if print_stats:
+        print(homography.stats_message(f"{segment_name} {start_frame}-{end_frame}"))
+        if tracker is not None:
+            print(tracker.stats_message(f"{segment_name} {start_frame}-{end_frame}"))
+
+    return current_hough_params
+
+def build_frame_result(frame_count, segment_name, ball_bbox, norm_ball_x, norm_ball_y,
+                       gaze_x_norm, gaze_y_norm, output_size, bbox_padding_factor):
+    """Costruisce la riga di output per un frame (box allargato, gaze-in-box, dimensioni normalizzate)."""
+    output_width, output_height = output_size
+    gaze_in_box_status = False
+    enlarged_bbox_coords = {'x': np.nan, 'y': np.nan, 'w': np.nan, 'h': np.nan}
+    if ball_bbox is not None:
+        x, y, w, h = ball_bbox
+        w_new, h_new = w * bbox_padding_factor, h * bbox_padding_factor
+        x_new, y_new = x - (w_new - w) / 2, y - (h_new - h) / 2
+        enlarged_bbox = (int(x_new), int(y_new), int(w_new), int(h_new))
+        enlarged_bbox_coords = {'x': enlarged_bbox[0], 'y': enlarged_bbox[1], 'w': enlarged_bbox[2], 'h': enlarged_bbox[3]}
+
+        ex, ey, ew, eh = enlarged_bbox
+        if pd.notna(gaze_x_norm) and pd.notna(gaze_y_norm):
+            gaze_px, gaze_py = int(gaze_x_norm * output_width), int(gaze_y_norm * output_height)
+            if (ex <= gaze_px <= ex + ew) and (ey <= gaze_py <= ey + eh):
+                gaze_in_box_status = True
+
+    # Calcolo delle dimensioni normalizzate della palla
+    norm_ball_w, norm_ball_h = np.nan, np.nan
+    if ball_bbox is not None:
+        _, _, w, h = ball_bbox
+        norm_ball_w = w / output_width
+        norm_ball_h = h / output_height
+
+    return {
+        'frame': frame_count, 'ball_center_x_norm': norm_ball_x, 'ball_center_y_norm': norm_ball_y,
+        'ball_w_norm': norm_ball_w, 'ball_h_norm': norm_ball_h, 'gaze_x_norm': gaze_x_norm,
+        'gaze_y_norm': gaze_y_norm, 'gaze_in_box': gaze_in_box_status,
+        'enlarged_bbox_x': enlarged_bbox_coords['x'], 'enlarged_bbox_y': enlarged_bbox_coords['y'],
+        'enlarged_bbox_w': enlarged_bbox_coords['w'], 'enlarged_bbox_h': enlarged_bbox_coords['h'],
+        'segment_name': segment_name
+    }
+
+# --- Piano di rilevamento a blocchi (solo Hough) ---
+# Il rilevamento Hough è diviso in blocchi che iniziano dove lo stato dell'elaborazione riparte
+# comunque da zero: inizio di un segmento, primo frame di un trial (nuovi parametri di Hough) e, nei
+# tratti più lunghi, ogni DETECTION_BLOCK_FRAMES frame. Ogni blocco usa un tracker e una cache
+# dell'omografia nuovi. I parametri di Hough dei blocchi vengono calcolati in anticipo e in ordine
+# dal processo principale: l'esecuzione seriale e quella multi-processo elaborano gli stessi blocchi
+# con gli stessi parametri, quindi il risultato non dipende dal numero di processi.
+DETECTION_BLOCK_FRAMES = 300
+
+def build_hough_plan(cap, frame_index, segments, args):
+    """
+    Ritorna la lista dei blocchi (segment_name, start_frame, end_frame, output_size, hough_params).
+    Come nell'elaborazione frame per frame, i parametri vengono cercati sul primo frame elaborabile
+    e poi sul primo frame di ogni trial, e restano validi fino al ricalcolo successivo (anche tra segmenti).
+    """
+    plan = []
+    hough_params = None
+    for segment_name, start_frame, end_frame, output_size in segments:
+        detection_size = get_detection_size(output_size, getattr(args, 'detection_scale', 1.0))
+        frames = np.arange(start_frame, max(start_frame, min(end_frame, frame_index['n_frames'])))
+        valid = frame_index['valid'][frames]
+        trial_id = frame_index['trial_id'][frames]
+        trial_starts = set(frames[valid & (trial_id > 0) & (trial_id != frame_index['prev_trial_id'][frames])].tolist())
+
+        bounds = [(start_frame, hough_params)]
+        for frame_idx in frames[valid].tolist():
+            if hough_params is not None and frame_idx not in trial_starts:
+                continue
+            ret, frame = cap.read(frame_idx)
+            if not ret:
+                break
+            try:
+                # Cache nuova: è lo stesso raddrizzamento eseguito sul primo frame del blocco
+                warped_frame = HomographyCache(detection_size,
+                                               tolerance_px=getattr(args, 'homography_tolerance_px', 0.5),
+                                               use_remap=getattr(args, 'use_remap_tables', False)
+                                               ).warp(frame, frame_index['corners'][frame_idx])
+            except Exception:
+                continue
+            if frame_idx in trial_starts:
+                print(f"INFO: Inizio nuovo trial ({int(frame_index['trial_id'][frame_idx])}). Ricalcolo parametri Hough...")
+            hough_params = find_optimal_hough_params(warped_frame)
+            if frame_idx == start_frame:
+                bounds[0] = (frame_idx, hough_params)
+            else:
+                bounds.append((frame_idx, hough_params))
+
+        for i, (block_start, params) in enumerate(bounds):
+            block_end = bounds[i + 1][0] if i + 1 < len(bounds) else end_frame
+            for chunk_start in range(block_start, block_end, DETECTION_BLOCK_FRAMES):
+                plan.append((segment_name, chunk_start, min(chunk_start + DETECTION_BLOCK_FRAMES, block_end),
+                             output_size, params))
+    return plan
+
+def process_plan_block(cap, frame_index, block, args, emit):
+    segment_name, start_frame, end_frame, output_size, hough_params = block
+    process_frame_range(cap, frame_index, segment_name, start_frame, end_frame, output_size, args, emit,
+                        hough_params=hough_params, recompute_hough=False, print_stats=False)
+
+# --- Esecuzione multi-processo (solo Hough) ---
+# Ogni processo apre il proprio lettore video una sola volta; lo stato condiviso viene passato
+# dall'initializer del pool invece che con ogni blocco. I processi vengono avviati con 'spawn'
+# (non 'fork'): un processo figlio non eredita lo stato di Tk della GUI.
+_WORKER_STATE = {}
+
+def _init_detection_worker(input_video_path, frame_index, args):
+    # La GUI reindirizza stdout/stderr su un widget Tk: nei processi figli si torna ai flussi standard
+    sys.stdout = sys.__stdout__ or open(os.devnull, 'w')
+    sys.stderr = sys.__stderr__ or open(os.devnull, 'w')
+    _WORKER_STATE['cap'] = SequentialFrameReader(input_video_path)
+    _WORKER_STATE['frame_index'] = frame_index
+    _WORKER_STATE['args'] = args
+
+def _process_block(block):
+    results = []
+    process_plan_block(_WORKER_STATE['cap'], _WORKER_STATE['frame_index'], block, _WORKER_STATE['args'], results.append)
+    return results
+
+def run_detection_parallel(input_video_path, frame_index, plan, args, workers, emit):
+    """
+    Elabora i blocchi del piano in un pool di processi e passa i risultati a `emit` nell'ordine
+    dei frame, man mano che i blocchi vengono completati (quindi vengono scritti e salvati nel
+    checkpoint durante l'elaborazione, non solo alla fine).
+    """
+    print(f"\nINFO: Rilevamento parallelo con {workers} processi su {len(plan)} blocchi di frame...")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                                initializer=_init_detection_worker,
+                                                initargs=(input_video_path, frame_index, args)) as executor:
+        # executor.map restituisce i risultati nello stesso ordine dei blocchi
+        for block_results in executor.map(_process_block, plan, chunksize=1):
+            for result in block_results:
+                emit(result)
+
+
+def build_detection_fingerprint(args, input_paths):
+    """
+    Impronta degli input e dei parametri che influenzano i risultati del rilevamento.
+    Il numero di processi non ne fa parte: il piano a blocchi rende il risultato indipendente da esso.
+    """
+    return {
+        'files': {os.path.basename(path): file_fingerprint(path) for path in input_paths},
+        'params': {
+            'use_yolo': bool(args.use_yolo),
+            # Impronta del file dei pesi, non solo il nome: dei pesi sostituiti invalidano il checkpoint
+            'yolo_model': file_fingerprint(args.yolo_model) if args.use_yolo else None,
+            'bbox_padding_factor': float(args.bbox_padding_factor),
+            'detection_scale': float(getattr(args, 'detection_scale', 1.0)),
+            'use_tracker': bool(getattr(args, 'use_tracker', False)),
+            'tracker_window_factor': float(getattr(args, 'tracker_window_factor', 3.0)),
+            'homography_tolerance_px': float(getattr(args, 'homography_tolerance_px', 0.5)),
+            'use_remap_tables': bool(getattr(args, 'use_remap_tables', False)),
+        },
+    }
+
 
 def main(args):
     # --- CORREZIONE: Ho riorganizzato la logica per renderla più robusta ---
 
+    # La memoizzazione dei parametri di Hough vale solo per questa esecuzione: una nuova analisi
+    # (anche con un video diverso, dalla stessa sessione della GUI) riparte da una cache vuota.
+    clear_hough_params_cache()
+
     world_timestamps_path = os.path.join(args.input_dir, 'world_timestamps.csv')
     gaze_csv_path = os.path.join(args.input_dir, 'gaze.csv')
     surface_positions_path = os.path.join(args.input_dir, 'surface_positions.csv')
@@ -161,22 +656,16 @@ def main(args):
     if aligned_gaze_data.empty:
         raise ValueError("Errore: Dati di allineamento vuoti.")
 
-    surface_positions = pd.read_csv(surface_positions_path)
-    if 'world_index' not in surface_positions.columns:
-        surface_positions['world_index'] = surface_positions.index
+    surface_positions = data_loader.load_surface_positions(surface_positions_path)
 
     # --- NUOVO: Pre-carica gli eventi per sapere quando ricalcolare i parametri ---
     # Questo ci permette di sapere in anticipo a quale trial appartiene ogni frame.
     manual_events_path = os.path.join(args.output_dir, 'manual_events_fixed.csv')
     if os.path.exists(manual_events_path):
         df_events = pd.read_csv(manual_events_path)
-        # Crea una colonna 'trial_id' nel dataframe principale basata sugli eventi
-        aligned_gaze_data['trial_id'] = 0
-        trial_counter = 0
-        for _, event in df_events.iterrows():
-            trial_counter += 1
-            mask = (aligned_gaze_data['world_index'] >= event['start_frame']) & (aligned_gaze_data['world_index'] <= event['end_frame'])
-            aligned_gaze_data.loc[mask, 'trial_id'] = trial_counter
+        # Crea una colonna 'trial_id' nel dataframe principale basata sugli eventi (numerati in ordine)
+        aligned_gaze_data['trial_id'] = assign_intervals(
+            aligned_gaze_data['world_index'], df_events['start_frame'], df_events['end_frame']) + 1
     else:
         # Se non ci sono eventi manuali, non possiamo sapere quando ricalcolare.
         # In questo scenario (improbabile), manteniamo la logica di calcolo singolo.
@@ -185,6 +674,8 @@ def main(args):
     # Aggiungiamo uno shift per confrontare il trial_id con quello precedente
     aligned_gaze_data['prev_trial_id'] = aligned_gaze_data['trial_id'].shift(1).fillna(0)
 
+    frame_index = build_frame_index(aligned_gaze_data, surface_positions)
+
     df_cuts = pd.read_csv(cut_points_path)
 
     # Configurazione del modello di rilevamento
@@ -192,142 +683,115 @@ def main(args):
     if args.use_yolo:
         if not os.path.exists(args.yolo_model):
             raise FileNotFoundError(f"Modello YOLO non trovato: {args.yolo_model}")
-        print(f"Caricamento del modello YOLOv8 da {args.yolo_model}...")
-        model = YOLO(args.yolo_model)
+        # Caricato una sola volta per processo e riusato dalle analisi successive
+        model = model_registry.get_yolo_model(args.yolo_model)
         classes = model.names
         sports_ball_class_id = list(classes.keys())[list(classes.values()).index('sports ball')]
         print("Modello YOLOv8 caricato.")
     else:
         print("Modalità di rilevamento: Trasformata di Hough per Cerchi (con ricerca parametri automatica).")
 
-    # Inizializzazione video
-    cap = cv2.VideoCapture(input_video_path)
-    if not cap.isOpened():
-        raise IOError(f"Errore: Impossibile aprire il video {input_video_path}")    
-    analysis_results = []
+    workers = int(getattr(args, 'workers', 1) or 1)
+    if workers > 1 and args.use_yolo:
+        # Il modello YOLO è già parallelo (GPU/torch): non ha senso duplicarlo in ogni processo.
+        print("INFO: Modalità multi-processo disponibile solo per Hough. Uso un singolo processo per YOLO.")
+        workers = 1
 
-    # I parametri verranno ora ricalcolati per ogni trial
-    current_hough_params = None
-
-    # Ciclo principale sui segmenti (fast/slow)
+    # Le dimensioni dell'output di ogni segmento dipendono solo dalle posizioni della superficie,
+    # quindi le calcoliamo in anticipo: così tutti i processi usano la stessa geometria.
+    segments = []
     for _, cut_row in df_cuts.iterrows():
         segment_name = cut_row['segment_name']
         start_frame = int(cut_row['start_frame'])
         end_frame = int(cut_row['end_frame'])
-
-        print(f"\n--- Elaborazione del segmento: '{segment_name}' (Frame {start_frame}-{end_frame}) ---")
-        output_width, output_height = 0, 0 # Verranno determinate al primo frame valido
-        frame_count = start_frame
-        while frame_count < end_frame:
-            # --- CORREZIONE LOGICA ---
-            # 1. Imposta la posizione esatta del frame che vogliamo leggere.
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_count)
-            # 2. Leggi SUBITO DOPO il frame a quella posizione.
-            ret, original_frame = cap.read()
-            if not ret:
-                print(f"ATTENZIONE: Interruzione anticipata del video prima del frame {end_frame}.")
-                break
-
-            # Recupera informazioni su sguardo e superficie per il frame corrente
-            current_frame_gaze_info = aligned_gaze_data[aligned_gaze_data['world_index'] == frame_count]
-            crop_info = surface_positions[surface_positions['world_index'] == frame_count]
-
-            # Salta il frame se mancano dati essenziali
-            if current_frame_gaze_info.empty or crop_info.empty or crop_info[['tl x [px]', 'tl y [px]']].isnull().values.any():
-                print(f"INFO: Dati di sguardo o superficie mancanti per il frame {frame_count}. Salto.")
-                frame_count += 1
-                continue
-            
-            gaze_info = current_frame_gaze_info.iloc[0]
-            warped_frame = None
-
-            # Tenta di eseguire la correzione della prospettiva
-            try:
-                src_pts = np.array([[crop_info[f'{corner} x [px]'].iloc[0], crop_info[f'{corner} y [px]'].iloc[0]] for corner in ['tl', 'tr', 'br', 'bl']], dtype=np.float32)
-                
-                if output_width == 0: # Calcola le dimensioni solo una volta
-                    w1 = np.linalg.norm(src_pts[0] - src_pts[1])
-                    w2 = np.linalg.norm(src_pts[3] - src_pts[2])
-                    output_width = int(max(w1, w2))
-
-                    h1 = np.linalg.norm(src_pts[0] - src_pts[3])
-                    h2 = np.linalg.norm(src_pts[1] - src_pts[2])
-                    output_height = int(max(h1, h2))
-
-                    if output_width <= 0 or output_height <= 0:
-                        print(f"ATTENZIONE: Dimensioni del frame non valide ({output_width}x{output_height}), salto il frame {frame_count}")
-                        frame_count += 1
-                        continue
-
-                # Ora che le dimensioni sono note, calcola la trasformazione
-                dst_pts = np.array([[0, 0], [output_width - 1, 0], [output_width - 1, output_height - 1], [0, output_height - 1]], dtype=np.float32)
-                matrix = cv2.getPerspectiveTransform(src_pts, dst_pts)
-                warped_frame = cv2.warpPerspective(original_frame, matrix, (output_width, output_height))
-
-            except Exception as e:
-                print(f"Errore di elaborazione prospettiva al frame {frame_count}: {e}")
-                frame_count += 1
-                continue
-
-            # --- Da qui in poi, siamo sicuri che 'warped_frame' e 'out' sono validi ---
-
-            # Rilevamento della palla (YOLO o Hough)
-            # --- NUOVA LOGICA: Ricalcola i parametri all'inizio di ogni trial ---
-            is_start_of_new_trial = (gaze_info['trial_id'] > 0 and gaze_info['trial_id'] != gaze_info['prev_trial_id'])
-            if not args.use_yolo and (current_hough_params is None or is_start_of_new_trial):
-                if is_start_of_new_trial:
-                    print(f"INFO: Inizio nuovo trial ({int(gaze_info['trial_id'])}). Ricalcolo parametri Hough...")
-                current_hough_params = find_optimal_hough_params(warped_frame)
-
-            ball_bbox, norm_ball_x, norm_ball_y = None, np.nan, np.nan
-            if args.use_yolo:
-                ball_bbox, norm_ball_x, norm_ball_y = detect_ball_yolo(warped_frame, model, sports_ball_class_id)
+        output_size = find_segment_output_size(frame_index, start_frame, end_frame)
+        if output_size == (0, 0):
+            print(f"ATTENZIONE: Nessun frame con superficie valida nel segmento '{segment_name}'. Salto.")
+            continue
+        segments.append((segment_name, start_frame, end_frame, output_size))
+
+    # Checkpoint: se input e parametri coincidono con l'esecuzione precedente, si riprende
+    # automaticamente dall'ultimo blocco salvato (o si salta il rilevamento se era completo).
+    coords_output_path = os.path.join(args.output_dir, "output_final_analysis_analysis.csv")
+    parquet_output_path = os.path.join(args.output_dir, "output_final_analysis_analysis.parquet") if getattr(args, 'write_parquet', False) else None
+    input_paths = [input_video_path, gaze_csv_path, surface_positions_path, world_timestamps_path,
+                   cut_points_path, manual_events_path]
+    checkpoint = DetectionCheckpoint(args.output_dir, build_detection_fingerprint(args, input_paths))
+    use_checkpoint = getattr(args, 'use_checkpoint', True)
+    checkpoint_valid = use_checkpoint and checkpoint.load()
+    if checkpoint_valid and checkpoint.completed and os.path.exists(coords_output_path) \
+            and (parquet_output_path is None or os.path.exists(parquet_output_path)):
+        print(f"INFO: Rilevamento già completato con gli stessi input e parametri (checkpoint). Uso {coords_output_path}.")
+        return
+
+    # I risultati vengono scritti a blocchi durante l'elaborazione. Con 'resume' (o con un
+    # checkpoint valido) si riprende dall'ultimo frame già scritto da un'esecuzione precedente.
+    writer = StreamingResultWriter(coords_output_path, RESULT_COLUMNS,
+                                   flush_every=getattr(args, 'flush_every', 500),
+                                   parquet_path=parquet_output_path,
+                                   resume=getattr(args, 'resume', False) or checkpoint_valid,
+                                   on_flush=checkpoint.record_chunk if use_checkpoint else None)
+    if use_checkpoint and writer.last_flushed_frame is None:
+        checkpoint.reset()
+
+    resume_frame = None
+    emit = writer.append
+    if writer.last_flushed_frame is not None:
+        resume_frame = writer.last_flushed_frame + 1
+        print(f"INFO: Ripresa dell'analisi dopo il frame {writer.last_flushed_frame} ({writer.rows_written} frame già salvati).")
+
+        def emit(result):
+            # Il blocco che contiene il punto di ripresa viene rielaborato dall'inizio, con lo
+            # stesso stato di un'esecuzione senza interruzioni: le righe già salvate vengono scartate.
+            if result['frame'] >= resume_frame:
+                writer.append(result)
+
+    with writer:
+        # Inizializzazione video: il lettore esegue un seek solo all'inizio di ogni segmento
+        # (o in presenza di un salto reale) e poi decodifica in avanti in modo sequenziale.
+        cap = SequentialFrameReader(input_video_path)
+        if not cap.isOpened():
+            raise IOError(f"Errore: Impossibile aprire il video {input_video_path}")
+
+        if args.use_yolo:
+            if resume_frame is not None:
+                segments = [(name, max(start, resume_frame), end, size)
+                            for name, start, end, size in segments if end > resume_frame]
+            # Ciclo principale sui segmenti (fast/slow)
+            for segment_name, start_frame, end_frame, output_size in segments:
+                print(f"\n--- Elaborazione del segmento: '{segment_name}' (Frame {start_frame}-{end_frame}) ---")
+                process_frame_range(cap, frame_index, segment_name, start_frame, end_frame, output_size, args,
+                                    emit, model, sports_ball_class_id)
+        else:
+            if checkpoint_valid and checkpoint.plan is not None and resume_frame is not None:
+                # Il piano dipende solo da input e parametri, già verificati dall'impronta del checkpoint
+                print("INFO: Piano di rilevamento ripreso dal checkpoint (ricerca dei parametri di Hough saltata).")
+                plan = [(name, start, end, tuple(size), params) for name, start, end, size, params in checkpoint.plan]
+            else:
+                print("\nINFO: Ricerca dei parametri di Hough per ogni trial...")
+                plan = build_hough_plan(cap, frame_index, segments, args)
+                if use_checkpoint:
+                    checkpoint.record_plan(plan)
+            if resume_frame is not None:
+                plan = [block for block in plan if block[2] > resume_frame]
+            if workers > 1:
+                run_detection_parallel(input_video_path, frame_index, plan, args, workers, emit)
             else:
-                ball_bbox, norm_ball_x, norm_ball_y = detect_ball_hough(warped_frame, current_hough_params)
-
-            # Logica per disegnare overlay (direzione, gaze, box)
-            gaze_in_box_status, gaze_color = False, (0, 0, 255)
-            enlarged_bbox_coords = {'x': np.nan, 'y': np.nan, 'w': np.nan, 'h': np.nan}
-            if ball_bbox is not None:
-                x, y, w, h = ball_bbox
-                w_new, h_new = w * args.bbox_padding_factor, h * args.bbox_padding_factor
-                x_new, y_new = x - (w_new - w) / 2, y - (h_new - h) / 2
-                enlarged_bbox = (int(x_new), int(y_new), int(w_new), int(h_new))
-                enlarged_bbox_coords = {'x': enlarged_bbox[0], 'y': enlarged_bbox[1], 'w': enlarged_bbox[2], 'h': enlarged_bbox[3]}
-                
-                ex, ey, ew, eh = enlarged_bbox
-                if pd.notna(gaze_info['gaze_x_norm']) and pd.notna(gaze_info['gaze_y_norm']):
-                    gaze_px, gaze_py = int(gaze_info['gaze_x_norm'] * output_width), int(gaze_info['gaze_y_norm'] * output_height)
-                    if (ex <= gaze_px <= ex + ew) and (ey <= gaze_py <= ey + eh):
-                        gaze_in_box_status, gaze_color = True, (0, 255, 255)
-            
-            # Calcolo delle dimensioni normalizzate della palla
-            norm_ball_w, norm_ball_h = np.nan, np.nan
-            if ball_bbox is not None:
-                _, _, w, h = ball_bbox
-                norm_ball_w = w / output_width
-                norm_ball_h = h / output_height
-            
-            # Salvataggio dei risultati di analisi per questo frame
-            result_data = {
-                'frame': frame_count, 'ball_center_x_norm': norm_ball_x, 'ball_center_y_norm': norm_ball_y,
-                'ball_w_norm': norm_ball_w, 'ball_h_norm': norm_ball_h, 'gaze_x_norm': gaze_info['gaze_x_norm'],
-                'gaze_y_norm': gaze_info['gaze_y_norm'], 'gaze_in_box': gaze_in_box_status,
-                'enlarged_bbox_x': enlarged_bbox_coords['x'], 'enlarged_bbox_y': enlarged_bbox_coords['y'],
-                'enlarged_bbox_w': enlarged_bbox_coords['w'], 'enlarged_bbox_h': enlarged_bbox_coords['h'],
-                'segment_name': segment_name
-            }
-            analysis_results.append(result_data)
+                current_segment = None
+                for block in plan:
+                    if block[0] != current_segment:
+                        current_segment = block[0]
+                        print(f"\n--- Elaborazione del segmento: '{current_segment}' ---")
+                    process_plan_block(cap, frame_index, block, args, emit)
 
-            frame_count += 1
+        # Chiusura finale
+        print(f"\nINFO: Decodifica video completata ({cap.read_count} frame letti, {cap.seek_count} seek).")
+        cap.release()
 
-    # Chiusura finale
-    cap.release()
+    if use_checkpoint:
+        checkpoint.mark_completed()
 
-    if analysis_results:
-        coords_df = pd.DataFrame(analysis_results)
-        coords_output_path = os.path.join(args.output_dir, "output_final_analysis_analysis.csv")
-        coords_df.to_csv(coords_output_path, index=False)
+    if writer.rows_written:
         print(f"\nDati di analisi dettagliati salvati in {coords_output_path}")
 
     print(f"\nElaborazione di tutti i segmenti completata.")
\ No newline at end of file
@@ -5,6 +5,7 @@ import zipfile
 import shutil
 import glob
 from tkinter import messagebox
+import data_loader
 
 def find_file_recursively(root_dir, filename_pattern):
     """
@@ -118,6 +119,10 @@ def organize_files(source_dir):
                 print(f"ATTENZIONE: File '{dest_name}' non trovato ricorsivamente in '{base_folder}'")
         # --- FINE MODIFICA ---
 
+        # Conversione dei CSV in formato binario: le analisi successive non devono rianalizzare il testo
+        print("INFO: Creazione della cache binaria dei dati...")
+        data_loader.build_binary_cache(output_data_dir)
+
         messagebox.showinfo("Operazione Completata", f"Dati organizzati con successo!\n\nInput: {output_data_dir}\nOutput: {analysis_output_dir}")
         print(f"\n--- Organizzazione completata. Dati pronti in '{output_data_dir}' ---")
         return output_data_dir, analysis_output_dir
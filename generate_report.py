@@ -2,7 +2,8 @@ import pandas as pd
 import numpy as np
 import os
 import cv2
-import re # Importa il modulo re per la pulizia dei nomi delle colonne
+import data_loader
+from interval_utils import assign_intervals, lookup_labels
 import matplotlib.pyplot as plt
 import seaborn as sns
 from scipy.interpolate import interp1d
@@ -28,17 +29,11 @@ def load_manual_events(df_main, manual_events_path):
     except Exception as e:
         raise Exception(f"Errore nella lettura del file CSV degli eventi: {e}")
 
-    df_main['direction'] = ''
-    df_main['trial_id'] = 0
-    df_main['direction_simple'] = ''
-    trial_counter = 0
-
-    for _, event in df_events.iterrows():
-        trial_counter += 1
-        mask = (df_main['frame'] >= event['start_frame']) & (df_main['frame'] <= event['end_frame'])
-        df_main.loc[mask, 'trial_id'] = trial_counter
-        df_main.loc[mask, 'direction_simple'] = event['direction_simple']
-        df_main.loc[mask, 'direction'] = f"center_to_{event['direction_simple']}"
+    # Ogni frame riceve l'evento (trial) che lo contiene; i trial sono numerati nell'ordine del file
+    event_idx = assign_intervals(df_main['frame'], df_events['start_frame'], df_events['end_frame'])
+    df_main['direction'] = lookup_labels(event_idx, [f"center_to_{d}" for d in df_events['direction_simple']])
+    df_main['trial_id'] = event_idx + 1
+    df_main['direction_simple'] = lookup_labels(event_idx, df_events['direction_simple'])
 
     df_main['ball_speed'] = np.sqrt(df_main['ball_center_x_norm'].diff()**2 + df_main['ball_center_y_norm'].diff()**2)
     df_main['gaze_speed'] = np.sqrt(df_main['gaze_x_norm'].diff()**2 + df_main['gaze_y_norm'].diff()**2)
@@ -47,43 +42,48 @@ def load_manual_events(df_main, manual_events_path):
     print(f"INFO: Caricati e applicati {len(df_events)} eventi manuali.")
     return df_main
 
+MOVEMENT_DIRECTIONS = ['up', 'down', 'left', 'right']
+
+def classify_ball_zones(x, y):
+    """Zona dello schermo per ogni posizione normalizzata della palla (versione vettoriale)."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    conditions = [
+        np.isnan(x) | np.isnan(y),
+        (0.40 < x) & (x < 0.60) & (0.40 < y) & (y < 0.60),
+        y <= 0.40,
+        y >= 0.60,
+        x <= 0.40,
+        x >= 0.60,
+    ]
+    return np.select(conditions, ['other', 'center', 'up', 'down', 'left', 'right'], default='other').astype(object)
+
 def calculate_movement_data(df):
     """Calcola automaticamente i trial basandosi sul movimento della palla."""
     print("INFO: Calcolo automatico di 'direction' e 'trial_id'...")
-    def get_zone(x, y):
-        if pd.isna(x) or pd.isna(y): return 'other'
-        if 0.40 < x < 0.60 and 0.40 < y < 0.60: return 'center'
-        if y <= 0.40: return 'up'
-        if y >= 0.60: return 'down'
-        if x <= 0.40: return 'left'
-        if x >= 0.60: return 'right'
-        return 'other'
-    df['zone'] = df.apply(lambda row: get_zone(row['ball_center_x_norm'], row['ball_center_y_norm']), axis=1)
-    df['direction'], df['trial_id'], df['direction_simple'] = '', 0, ''
-    trial_counter, in_trial = 0, False
-    current_direction = ''
-    for i in range(1, len(df)):
-        prev_zone = df.loc[i-1, 'zone']
-        curr_zone = df.loc[i, 'zone']
-        
-        if not in_trial and prev_zone == 'center' and curr_zone not in ['center', 'other']:
-            in_trial = True
-            trial_counter += 1
-            current_direction = curr_zone
-        
-        if in_trial:
-            df.loc[i, 'trial_id'] = trial_counter
-            df.loc[i, 'direction'] = f"center_to_{current_direction}"
-            df.loc[i, 'direction_simple'] = current_direction
-        
-        if in_trial and curr_zone == 'center':
-            in_trial = False
-            current_direction = ''
-    
+    zone = classify_ball_zones(df['ball_center_x_norm'], df['ball_center_y_norm'])
+    idx = np.arange(len(zone))
+    is_center = zone == 'center'
+
+    # Un trial inizia quando la palla esce dal centro verso una direzione e termina (incluso)
+    # al primo frame successivo di nuovo al centro. Il frame 0 non può mai iniziare un trial.
+    is_start = np.zeros(len(zone), dtype=bool)
+    is_start[1:] = is_center[:-1] & np.isin(zone[1:], MOVEMENT_DIRECTIONS)
+    last_start = np.maximum.accumulate(np.where(is_start, idx, -1))
+    last_center = np.maximum.accumulate(np.where(is_center, idx, -1))
+    last_center_before = np.concatenate(([-1], last_center))[:-1]
+    # Il frame appartiene al trial se dopo l'ultimo inizio non c'è stato un ritorno al centro
+    in_trial = (last_start >= 0) & (last_start > last_center_before)
+
+    trial_counter = int(is_start.sum())
+    direction_simple = np.where(in_trial, zone[np.maximum(last_start, 0)], '').astype(object)
+    df['direction'] = np.where(in_trial, 'center_to_' + direction_simple, '').astype(object)
+    df['trial_id'] = np.where(in_trial, np.cumsum(is_start), 0)
+    df['direction_simple'] = direction_simple
+
     df['ball_speed'] = np.sqrt(df['ball_center_x_norm'].diff()**2 + df['ball_center_y_norm'].diff()**2)
     df['gaze_speed'] = np.sqrt(df['gaze_x_norm'].diff()**2 + df['gaze_y_norm'].diff()**2)
     df.loc[df['trial_id'] != df['trial_id'].shift(1), ['ball_speed', 'gaze_speed']] = np.nan
-    df.drop(columns=['zone'], inplace=True)
     print(f"INFO: Calcolo completato. Trovati {trial_counter} trial.")
     return df
 
@@ -95,22 +95,17 @@ def add_pupil_data(df_main, base_dir):
         return df_main
 
     print("INFO: Aggiunta dei dati pupillari...")
-    df_pupil = pd.read_csv(pupil_path)
+    df_pupil = data_loader.load_eye_states(pupil_path)
     
-    if 'timestamp [ns]' not in df_pupil.columns:
+    if 'pupil_timestamp_ns' not in df_pupil.columns:
         print("ATTENZIONE: Colonna 'timestamp [ns]' non trovata in 3d_eye_states.csv.")
         return df_main
     
-    df_pupil.rename(columns={'timestamp [ns]': 'pupil_timestamp_ns'}, inplace=True)
     df_pupil['pupil_timestamp_dt'] = pd.to_datetime(df_pupil['pupil_timestamp_ns'], unit='ns')
-    
-    left_pupil_col_orig = 'pupil diameter left [mm]'
-    right_pupil_col_orig = 'pupil diameter right [mm]'
-
-    df_pupil.columns = [re.sub(r'[^a-zA-Z0-9_\[\]]', '', col).strip() for col in df_pupil.columns]
 
-    left_pupil_col_clean = re.sub(r'[^a-zA-Z0-9_\[\]]', '', left_pupil_col_orig).strip()
-    right_pupil_col_clean = re.sub(r'[^a-zA-Z0-9_\[\]]', '', right_pupil_col_orig).strip()
+    # I nomi delle colonne pupillari arrivano già ripuliti dal loader
+    left_pupil_col_clean = data_loader.clean_pupil_column_name('pupil diameter left [mm]')
+    right_pupil_col_clean = data_loader.clean_pupil_column_name('pupil diameter right [mm]')
 
     if left_pupil_col_clean in df_pupil.columns and right_pupil_col_clean in df_pupil.columns:
         df_pupil[PUPIL_COL_NAME] = df_pupil[[left_pupil_col_clean, right_pupil_col_clean]].mean(axis=1)
@@ -278,17 +273,81 @@ def calculate_excursion(df_input, success_threshold):
     return df_output
 
 def calculate_running_gaze_in_box_percentage(df_input):
-    """Calcola la percentuale progressiva di gaze_in_box per ogni trial."""
+    """
+    Calcola la percentuale progressiva di gaze_in_box per ogni trial (NaN sui frame fuori dai trial).
+    Somma e conteggio cumulativi per gruppo sono calcolati in un solo passaggio, senza funzioni per trial.
+    """
     if 'trial_id' not in df_input.columns: return df_input
-    
-    df_input['running_gaze_in_box_perc'] = df_input.groupby('trial_id')['gaze_in_box'].transform(
-        lambda x: (x.cumsum() / (np.arange(len(x)) + 1)) * 100
-    )
+
+    is_trial = df_input['trial_id'] > 0
+    trial_groups = df_input.loc[is_trial, 'gaze_in_box'].groupby(df_input.loc[is_trial, 'trial_id'], sort=False)
+    df_input['running_gaze_in_box_perc'] = np.nan
+    df_input.loc[is_trial, 'running_gaze_in_box_perc'] = trial_groups.cumsum() / (trial_groups.cumcount() + 1) * 100
     return df_input
 
+# Per ogni direzione: coordinata della palla, dimensione della palla e coordinata dello sguardo
+# sull'asse del movimento, dimensione del frame per la conversione in pixel e verso del movimento
+# (-1 = verso valori decrescenti, cioè su/sinistra; +1 = verso valori crescenti, cioè giù/destra).
+DIRECTIONAL_EXCURSION_AXES = {
+    'up': ('ball_center_y_norm', 'ball_h_norm', 'gaze_y_norm', 'frame_height', -1),
+    'down': ('ball_center_y_norm', 'ball_h_norm', 'gaze_y_norm', 'frame_height', 1),
+    'left': ('ball_center_x_norm', 'ball_w_norm', 'gaze_x_norm', 'frame_width', -1),
+    'right': ('ball_center_x_norm', 'ball_w_norm', 'gaze_x_norm', 'frame_width', 1),
+}
+
+def compute_directional_trial_stats(df_input):
+    """
+    Statistiche per trial da cui dipende l'escursione direzionale, indipendenti dalla soglia.
+    Tutte le coordinate sono "orientate" (moltiplicate per il verso del movimento), così che
+    per ogni direzione il punto più lontano raggiunto sia un massimo:
+      - 'extreme_edge': bordo esterno della palla nel frame di massima escursione;
+      - 'max_signed_gaze': massima escursione dello sguardo nello stesso verso.
+    """
+    df_trials_only = df_input[df_input['trial_id'] > 0]
+    trial_codes, trial_ids = pd.factorize(df_trials_only['trial_id'], sort=True)
+
+    # La direzione di un trial è quella della sua prima riga
+    first_rows = df_trials_only.drop_duplicates('trial_id').set_index('trial_id').loc[trial_ids]
+    direction = first_rows['direction_simple']
+    sign = direction.map({d: axes[4] for d, axes in DIRECTIONAL_EXCURSION_AXES.items()}).to_numpy(dtype=float)
+    vertical = direction.isin(['up', 'down']).to_numpy()
+
+    row_vertical = vertical[trial_codes]
+    row_sign = sign[trial_codes]
+    coord = np.where(row_vertical, df_trials_only['ball_center_y_norm'], df_trials_only['ball_center_x_norm'])
+    size = np.where(row_vertical, df_trials_only['ball_h_norm'], df_trials_only['ball_w_norm'])
+    signed_gaze = row_sign * np.where(row_vertical, df_trials_only['gaze_y_norm'], df_trials_only['gaze_x_norm'])
+    signed_coord = row_sign * coord
+
+    # Riga di massima escursione della palla per ogni trial (la prima, in caso di parità)
+    row_number = np.arange(len(df_trials_only))
+    order = np.lexsort((row_number, -np.where(np.isnan(signed_coord), -np.inf, signed_coord), trial_codes))
+    group_starts = np.flatnonzero(np.r_[True, np.diff(trial_codes[order]) != 0])
+    extreme_rows = order[group_starts]
+
+    frame_dim = np.where(vertical, first_rows['frame_height'], first_rows['frame_width']).astype(float)
+    return pd.DataFrame({
+        'direction_simple': direction.to_numpy(),
+        'sign': sign,
+        'extreme_edge': signed_coord[extreme_rows] + size[extreme_rows] / 2,
+        'max_signed_gaze': np.fmax.reduceat(signed_gaze[order], group_starts),
+        'frame_dim': frame_dim,
+    }, index=pd.Index(trial_ids, name='trial_id'))
+
+def apply_directional_threshold(trial_stats, margin_perc):
+    """
+    Applica la soglia di bordo alle statistiche per trial. Ritorna (successo per trial,
+    coordinata in pixel della linea di soglia per trial).
+    """
+    threshold_line = trial_stats['extreme_edge'] - margin_perc
+    success = trial_stats['max_signed_gaze'] >= threshold_line
+    line_coord = trial_stats['sign'] * threshold_line * trial_stats['frame_dim']
+    return success, line_coord
+
 def calculate_directional_excursion(df_input, margin_perc):
     """
     Calcola se lo sguardo ha superato la massima escursione della palla per ogni trial.
+    Aggiunge anche 'dir_ex_line_coord', la linea di soglia in pixel usata per l'overlay video.
     """
     print("\nINFO: Avvio calcolo metrica 'Escursione Direzionale'...")
     
@@ -297,67 +356,239 @@ def calculate_directional_excursion(df_input, margin_perc):
         df_input['directional_excursion_reached'] = 0.0
         df_input['directional_excursion_success'] = False
         return df_input
-    
-    df_trials_only = df_input[df_input['trial_id'] > 0].copy()
-    
-    df_input['dir_ex_line_coord'] = np.nan
 
-    def check_reach(group):
-        direction = group['direction_simple'].iloc[0]
-        
-        # --- CORREZIONE BUG ---
-        # Aggiungiamo un controllo per assicurarci che ci siano dati validi sulla posizione della palla
-        # prima di tentare di trovare il minimo/massimo. Se non ci sono, il trial non può avere successo.
-
-        if direction == 'up':
-            if group['ball_center_y_norm'].isnull().all(): return False
-            idx_min = group['ball_center_y_norm'].idxmin()
-            if pd.isna(idx_min): return False # Ulteriore sicurezza
-            ball_top_edge = group.loc[idx_min, 'ball_center_y_norm'] - (group.loc[idx_min, 'ball_h_norm'] / 2)
-            threshold_line_norm = ball_top_edge + margin_perc
-            group.loc[idx_min, 'dir_ex_line_coord'] = threshold_line_norm * group['frame_height'].iloc[0]
-            return (group['gaze_y_norm'] <= threshold_line_norm).any()
-            
-        elif direction == 'down':
-            if group['ball_center_y_norm'].isnull().all(): return False
-            idx_max = group['ball_center_y_norm'].idxmax()
-            if pd.isna(idx_max): return False
-            ball_bottom_edge = group.loc[idx_max, 'ball_center_y_norm'] + (group.loc[idx_max, 'ball_h_norm'] / 2)
-            threshold_line_norm = ball_bottom_edge - margin_perc
-            group.loc[idx_max, 'dir_ex_line_coord'] = threshold_line_norm * group['frame_height'].iloc[0]
-            return (group['gaze_y_norm'] >= threshold_line_norm).any()
-
-        elif direction == 'left':
-            if group['ball_center_x_norm'].isnull().all(): return False
-            idx_min = group['ball_center_x_norm'].idxmin()
-            if pd.isna(idx_min): return False
-            ball_left_edge = group.loc[idx_min, 'ball_center_x_norm'] - (group.loc[idx_min, 'ball_w_norm'] / 2)
-            threshold_line_norm = ball_left_edge + margin_perc
-            group.loc[idx_min, 'dir_ex_line_coord'] = threshold_line_norm * group['frame_width'].iloc[0]
-            return (group['gaze_x_norm'] <= threshold_line_norm).any()
-
-        elif direction == 'right':
-            if group['ball_center_x_norm'].isnull().all(): return False
-            idx_max = group['ball_center_x_norm'].idxmax()
-            if pd.isna(idx_max): return False
-            ball_right_edge = group.loc[idx_max, 'ball_center_x_norm'] + (group.loc[idx_max, 'ball_w_norm'] / 2)
-            threshold_line_norm = ball_right_edge - margin_perc
-            group.loc[idx_max, 'dir_ex_line_coord'] = threshold_line_norm * group['frame_width'].iloc[0]
-            return (group['gaze_x_norm'] >= threshold_line_norm).any()
-            
-        return False
-    
-    # Applica la funzione in modo sicuro. Se check_reach fallisce per qualche motivo imprevisto,
-    # il risultato per quel gruppo sarà False invece di far crashare il programma.
-    safe_apply = lambda group: check_reach(group) if not group.empty else False
-    results = df_trials_only.groupby('trial_id').apply(safe_apply)
+    trial_stats = compute_directional_trial_stats(df_input)
+    success, line_coord = apply_directional_threshold(trial_stats, margin_perc)
 
-    dir_excursion_data = results.reset_index(name='directional_excursion_success')
-    dir_excursion_data['directional_excursion_reached'] = dir_excursion_data['directional_excursion_success'].astype(float)
+    df_input['dir_ex_line_coord'] = df_input['trial_id'].map(line_coord)
+    df_input['directional_excursion_success'] = df_input['trial_id'].map(success)
+    df_input['directional_excursion_reached'] = df_input['trial_id'].map(success.astype(float))
+    print(f"  - ✅ Calcolo completato per {len(trial_stats)} trial.")
+    return df_input
 
-    df_output = df_input.merge(dir_excursion_data, on='trial_id', how='left')
-    print(f"  - ✅ Calcolo completato per {len(dir_excursion_data)} trial.")
-    return df_output
+TRIAL_STATISTICS_FILENAME = 'trial_statistics.csv'
+
+def build_trial_statistics(df_main, df_cuts):
+    """
+    Statistiche sufficienti per (segmento, trial, direzione), calcolate una sola volta dai dati
+    per frame: numero di frame, somme e conteggi di gaze_in_box, velocità dello sguardo e pupilla,
+    percentuale di frame in box dell'intero trial e statistiche dell'escursione direzionale.
+    Da queste si ricavano metriche di successo e riepiloghi per qualunque soglia.
+    """
+    has_pupil = PUPIL_COL_NAME in df_main.columns
+    df_trials_only = df_main[df_main['trial_id'] > 0]
+    if df_trials_only.empty:
+        return pd.DataFrame()
+
+    agg_dict = {
+        'n_frames': ('frame', 'size'),
+        'gaze_in_box_sum': ('gaze_in_box', 'sum'), 'gaze_in_box_count': ('gaze_in_box', 'count'),
+        'gaze_speed_sum': ('gaze_speed', 'sum'), 'gaze_speed_count': ('gaze_speed', 'count'),
+    }
+    if has_pupil:
+        agg_dict.update(pupil_sum=(PUPIL_COL_NAME, 'sum'), pupil_count=(PUPIL_COL_NAME, 'count'))
+
+    segment_stats = []
+    for segment_name, start_frame, end_frame in df_cuts[['segment_name', 'start_frame', 'end_frame']].itertuples(index=False):
+        df_segment = df_trials_only[(df_trials_only['frame'] >= start_frame) & (df_trials_only['frame'] <= end_frame)]
+        if df_segment.empty:
+            continue
+        stats = df_segment.groupby(['trial_id', 'direction_simple'], dropna=False, sort=False).agg(**agg_dict).reset_index()
+        stats.insert(0, 'segment_name', segment_name)
+        segment_stats.append(stats)
+    if not segment_stats:
+        return pd.DataFrame()
+    trial_stats = pd.concat(segment_stats, ignore_index=True)
+    if not has_pupil:
+        trial_stats['pupil_sum'], trial_stats['pupil_count'] = 0.0, 0
+
+    # Statistiche dell'intero trial (indipendenti dal segmento)
+    trial_stats['trial_gaze_in_box_mean'] = trial_stats['trial_id'].map(df_trials_only.groupby('trial_id')['gaze_in_box'].mean())
+    directional_stats = compute_directional_trial_stats(df_main).drop(columns=['direction_simple'])
+    return trial_stats.join(directional_stats, on='trial_id')
+
+def compute_threshold_metrics(trial_stats, success_threshold, margin_perc):
+    """Esiti di escursione ed escursione direzionale per ogni riga di `trial_stats`, per le soglie date."""
+    directional_success, _ = apply_directional_threshold(trial_stats, margin_perc)
+    return pd.DataFrame({
+        'excursion_success': trial_stats['trial_gaze_in_box_mean'] >= success_threshold,
+        'directional_excursion_success': directional_success,
+    }, index=trial_stats.index)
+
+def summarize_trial_statistics(trial_stats, success_threshold, margin_perc, include_excursion=True):
+    """
+    Ricostruisce i fogli di riepilogo (per segmento e direzione, e generale) dalle sole statistiche
+    per trial. Le medie restano pesate per frame, come quelle calcolate sui dati per frame.
+    Ritorna (dizionario segmento -> riepilogo per direzione, lista di riepiloghi generali).
+    """
+    stats = trial_stats.copy()
+    if include_excursion:
+        metrics = compute_threshold_metrics(stats, success_threshold, margin_perc)
+        stats['excursion_success_frames'] = metrics['excursion_success'] * stats['n_frames']
+        stats['excursion_perc_frames_weighted'] = stats['trial_gaze_in_box_mean'] * stats['n_frames']
+        stats['directional_success_frames'] = metrics['directional_excursion_success'] * stats['n_frames']
+
+    def ratio(numerator, denominator):
+        return numerator / denominator if denominator else np.nan
+
+    def summarize(group, include_pupil):
+        summary = {
+            'avg_gaze_in_box_perc': ratio(group['gaze_in_box_sum'].sum(), group['gaze_in_box_count'].sum()) * 100,
+            'avg_gaze_speed': ratio(group['gaze_speed_sum'].sum(), group['gaze_speed_count'].sum()),
+            'trial_count': group['trial_id'].nunique(),
+        }
+        if include_pupil:
+            summary['diametro_pupillare_medio'] = ratio(group['pupil_sum'].sum(), group['pupil_count'].sum())
+        if include_excursion:
+            n_frames = group['n_frames'].sum()
+            summary['excursion_success_perc'] = ratio(group['excursion_success_frames'].sum(), n_frames) * 100
+            summary['avg_excursion_perc_frames'] = ratio(group['excursion_perc_frames_weighted'].sum(), n_frames)
+            summary['directional_excursion_success_perc'] = ratio(group['directional_success_frames'].sum(), n_frames) * 100
+        return summary
+
+    segment_summaries, general_summary_list = {}, []
+    for segment_name, df_segment in stats.groupby('segment_name', sort=False):
+        # Come nel riepilogo per frame, la colonna pupillare compare solo se il segmento ha dati pupillari
+        include_pupil = df_segment['pupil_count'].sum() > 0
+        overall = summarize(df_segment, include_pupil)
+        segment_summaries[segment_name] = pd.DataFrame([
+            dict({'direction_simple': direction}, **summarize(df_dir, include_pupil))
+            for direction, df_dir in df_segment.dropna(subset=['direction_simple']).groupby('direction_simple')
+        ], columns=['direction_simple'] + list(overall.keys()))
+
+        gen_sum = {
+            'segmento': segment_name,
+            'gaze_in_box_perc_totale': overall['avg_gaze_in_box_perc'],
+            'velocita_sguardo_media': overall['avg_gaze_speed'],
+            'numero_trial_validi': overall['trial_count'],
+        }
+        if 'diametro_pupillare_medio' in overall:
+            gen_sum['diametro_pupillare_medio'] = overall['diametro_pupillare_medio']
+        if include_excursion:
+            gen_sum['escursione_successo_perc'] = overall['excursion_success_perc']
+            gen_sum['escursione_direzionale_successo_perc'] = overall['directional_excursion_success_perc']
+        general_summary_list.append(gen_sum)
+    return segment_summaries, general_summary_list
+
+# Griglie predefinite per l'analisi di sensibilità delle soglie
+DEFAULT_SWEEP_SUCCESS_THRESHOLDS = np.round(np.arange(0.50, 1.0001, 0.05), 2)
+DEFAULT_SWEEP_EDGE_THRESHOLDS = np.round(np.arange(0.0, 0.3001, 0.025), 3)
+
+def sweep_excursion_thresholds(trial_stats, success_thresholds=DEFAULT_SWEEP_SUCCESS_THRESHOLDS,
+                               edge_thresholds=DEFAULT_SWEEP_EDGE_THRESHOLDS):
+    """
+    Valuta in un solo passaggio vettoriale un'intera griglia di soglie di successo ('Escursione')
+    e di bordo ('Escursione Direzionale') sulle statistiche per trial.
+    Ritorna una tabella in formato lungo: metrica, soglia, segmento, direzione, percentuale di
+    successo (pesata per frame, come nei fogli di riepilogo) e numero di trial.
+    """
+    stats = trial_stats.dropna(subset=['direction_simple'])
+    success_thresholds = np.asarray(success_thresholds, dtype=float)
+    edge_thresholds = np.asarray(edge_thresholds, dtype=float)
+    n_frames = stats['n_frames'].to_numpy(dtype=float)[:, None]
+
+    # Matrici trial x soglia degli esiti, pesate per il numero di frame
+    outcomes = {
+        'escursione': (success_thresholds,
+                       stats['trial_gaze_in_box_mean'].to_numpy(dtype=float)[:, None] >= success_thresholds[None, :]),
+        'escursione_direzionale': (edge_thresholds,
+                                   stats['max_signed_gaze'].to_numpy(dtype=float)[:, None]
+                                   >= stats['extreme_edge'].to_numpy(dtype=float)[:, None] - edge_thresholds[None, :]),
+    }
+
+    keys = [stats['segment_name'], stats['direction_simple']]
+    group_frames = stats.groupby(keys, sort=False)['n_frames'].sum()
+    group_trials = stats.groupby(keys, sort=False)['trial_id'].nunique()
+    tables = []
+    for metric, (thresholds, outcome) in outcomes.items():
+        weighted = pd.DataFrame(outcome * n_frames, index=stats.index, columns=thresholds)
+        success_perc = weighted.groupby(keys, sort=False).sum().div(group_frames, axis=0) * 100
+        table = success_perc.rename_axis(columns='soglia').stack().rename('successo_perc').reset_index()
+        table.insert(0, 'metrica', metric)
+        tables.append(table)
+    sweep = pd.concat(tables, ignore_index=True)
+    sweep['trial_count'] = sweep.set_index(['segment_name', 'direction_simple']).index.map(group_trials)
+    return sweep[['metrica', 'soglia', 'segment_name', 'direction_simple', 'successo_perc', 'trial_count']]
+
+def apply_threshold_columns(df_main, trial_stats, success_threshold, margin_perc):
+    """
+    Ricalcola per nuove soglie le colonne per frame che ne dipendono ('excursion_success',
+    'directional_excursion_success', 'directional_excursion_reached', 'dir_ex_line_coord'),
+    usando per l'escursione direzionale le statistiche per trial. Le colonne assenti restano assenti.
+    """
+    if 'excursion_perc_frames' in df_main.columns:
+        perc = df_main['excursion_perc_frames']
+        df_main['excursion_success'] = (perc >= success_threshold).where(perc.notna())
+    if 'dir_ex_line_coord' in df_main.columns:
+        per_trial = trial_stats.drop_duplicates('trial_id').set_index('trial_id')
+        success, line_coord = apply_directional_threshold(per_trial, margin_perc)
+        rows = df_main['trial_id'].isin(per_trial.index)
+        trial_ids = df_main.loc[rows, 'trial_id']
+        df_main.loc[rows, 'dir_ex_line_coord'] = trial_ids.map(line_coord)
+        df_main.loc[rows, 'directional_excursion_success'] = trial_ids.map(success)
+        df_main.loc[rows, 'directional_excursion_reached'] = trial_ids.map(success.astype(float))
+    return df_main
+
+def update_threshold_metrics(args):
+    """
+    Aggiorna il report per nuove soglie di escursione senza rielaborare i dati per frame:
+    esiti e riepiloghi vengono ricalcolati dalle statistiche per trial salvate dall'ultimo report
+    completo, le colonne che dipendono dalle soglie vengono aggiornate nel CSV con le metriche e
+    'final_report.xlsx' viene riscritto. Grafici e heatmap non dipendono dalle soglie e restano invariati.
+    Ritorna (esiti per trial, riepiloghi per segmento, riepilogo generale).
+    """
+    stats_path = os.path.join(args.output_dir, TRIAL_STATISTICS_FILENAME)
+    final_csv_path = os.path.join(args.output_dir, 'output_final_analysis_with_metrics.csv')
+    for path in (stats_path, final_csv_path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"File del report non trovato: {path}. Esegui prima il report completo.")
+    try:
+        trial_stats = pd.read_csv(stats_path)
+    except pd.errors.EmptyDataError:
+        # Senza trial validi main() salva un file di statistiche vuoto
+        trial_stats = pd.DataFrame()
+    if trial_stats.empty:
+        print("INFO: Nessun trial valido nell'ultimo report: le nuove soglie non modificano i risultati.")
+        return pd.DataFrame(), {}, []
+
+    success_threshold = args.excursion_success_threshold
+    margin_perc = args.directional_excursion_edge_threshold
+    metrics = compute_threshold_metrics(trial_stats, success_threshold, margin_perc)
+    trial_results = pd.concat([trial_stats[['segment_name', 'trial_id', 'direction_simple']], metrics], axis=1)
+    segment_summaries, general_summary_list = summarize_trial_statistics(
+        trial_stats, success_threshold, margin_perc, include_excursion=args.run_excursion_analysis)
+
+    df_main = pd.read_csv(final_csv_path)
+    # I timestamp convertiti per il merge pupillare tornano datetime, come nel report completo
+    for column in ('world_timestamp_dt', 'pupil_timestamp_dt'):
+        if column in df_main.columns:
+            df_main[column] = pd.to_datetime(df_main[column])
+    if args.run_excursion_analysis:
+        df_main = apply_threshold_columns(df_main, trial_stats, success_threshold, margin_perc)
+    df_cuts = pd.read_csv(os.path.join(args.analysis_dir, 'cut_points.csv'))
+
+    # Stessi fogli, nello stesso ordine, del report completo generato da main()
+    with pd.ExcelWriter(os.path.join(args.output_dir, 'final_report.xlsx'), engine='xlsxwriter') as writer:
+        for _, cut_row in df_cuts.iterrows():
+            segment_name = cut_row['segment_name']
+            df_center_out = df_main[(df_main['frame'] >= cut_row['start_frame']) & (df_main['frame'] <= cut_row['end_frame'])
+                                    & (df_main['trial_id'] > 0)]
+            if df_center_out.empty:
+                continue
+            segment_summaries[segment_name].to_excel(writer, sheet_name=f"Riepilogo_{segment_name}", index=False)
+            df_center_out.to_excel(writer, sheet_name=f"Dettagli_{segment_name}", index=False)
+        if general_summary_list:
+            pd.DataFrame(general_summary_list).to_excel(writer, sheet_name="Riepilogo_Generale", index=False)
+        if getattr(args, 'run_threshold_sweep', False):
+            sweep = sweep_excursion_thresholds(
+                trial_stats,
+                getattr(args, 'sweep_success_thresholds', DEFAULT_SWEEP_SUCCESS_THRESHOLDS),
+                getattr(args, 'sweep_edge_thresholds', DEFAULT_SWEEP_EDGE_THRESHOLDS))
+            sweep.to_excel(writer, sheet_name="Analisi_Soglie", index=False)
+
+    df_main.to_csv(final_csv_path, index=False)
+    print(f"INFO: Report 'final_report.xlsx' aggiornato con le nuove soglie ({len(trial_results)} trial).")
+    return trial_results, segment_summaries, general_summary_list
 
 def main(args):
     analysis_path = os.path.join(args.analysis_dir, 'output_final_analysis_analysis.csv')
@@ -376,15 +607,13 @@ def main(args):
     world_timestamps_path = os.path.join(args.input_dir_for_pupil, 'world_timestamps.csv')
     if os.path.exists(world_timestamps_path):
         print("INFO: Trovato 'world_timestamps.csv'. Lo uso per sincronizzare i dati pupillari.")
-        df_world = pd.read_csv(world_timestamps_path)
-        df_world.rename(columns=lambda c: c.strip(), inplace=True)
-        if 'timestamp [ns]' in df_world.columns:
+        df_world = data_loader.load_world_timestamps(world_timestamps_path)
+        if 'world_timestamp_ns' in df_world.columns:
             df_world['frame'] = range(len(df_world))
             # Rimuovi la colonna timestamp se esiste già per evitare conflitti
             if 'world_timestamp_ns' in df_main.columns:
                 df_main.drop(columns=['world_timestamp_ns'], inplace=True)
-            df_main = pd.merge(df_main, df_world[['frame', 'timestamp [ns]']], on='frame', how='left')
-            df_main.rename(columns={'timestamp [ns]': 'world_timestamp_ns'}, inplace=True)
+            df_main = pd.merge(df_main, df_world[['frame', 'world_timestamp_ns']], on='frame', how='left')
             print("INFO: Timestamp del video uniti con successo al dataframe principale.")
         else:
             print("ATTENZIONE: 'world_timestamps.csv' trovato ma non contiene 'timestamp [ns]'.")
@@ -393,9 +622,8 @@ def main(args):
     # --- FINE MODIFICA ---
 
     df_cuts = pd.read_csv(cuts_path)
-    df_main['segment_name'] = ''
-    for _, row in df_cuts.iterrows():
-        df_main.loc[(df_main['frame'] >= row['start_frame']) & (df_main['frame'] <= row['end_frame']), 'segment_name'] = row['segment_name']
+    segment_idx = assign_intervals(df_main['frame'], df_cuts['start_frame'], df_cuts['end_frame'])
+    df_main['segment_name'] = lookup_labels(segment_idx, df_cuts['segment_name'])
 
     if hasattr(args, 'manual_events_path') and args.manual_events_path and os.path.exists(args.manual_events_path):
         df_main = load_manual_events(df_main, args.manual_events_path)
@@ -418,7 +646,13 @@ def main(args):
         df_main = calculate_directional_excursion(df_main, args.directional_excursion_edge_threshold)
         df_main = calculate_running_gaze_in_box_percentage(df_main)
 
-    general_summary_list = []
+    # Statistiche per trial: da queste derivano i riepiloghi, e vengono salvate per poter
+    # ricalcolare le metriche con soglie diverse senza rielaborare i dati per frame.
+    trial_stats = build_trial_statistics(df_main, df_cuts)
+    trial_stats.to_csv(os.path.join(args.output_dir, TRIAL_STATISTICS_FILENAME), index=False)
+    segment_summaries, general_summary_list = summarize_trial_statistics(
+        trial_stats, args.excursion_success_threshold, args.directional_excursion_edge_threshold,
+        include_excursion=args.run_excursion_analysis) if not trial_stats.empty else ({}, [])
 
     if args.run_fragmentation_analysis:
         generate_fragmentation_plots(df_main, df_cuts, plot_dir)
@@ -436,44 +670,10 @@ def main(args):
         if not (hasattr(args, 'manual_events_path') and args.manual_events_path and os.path.exists(args.manual_events_path)):
             validate_movement_sequence(df_center_out, expected_sequences.get(segment_name, []), segment_name)
         
-        agg_dict = {
-            'avg_gaze_in_box_perc': ('gaze_in_box', 'mean'),
-            'avg_gaze_speed': ('gaze_speed', 'mean'),
-            'trial_count': ('trial_id', 'nunique')
-        }
-        
-        if PUPIL_COL_NAME in df_center_out.columns and df_center_out[PUPIL_COL_NAME].notna().any():
-            agg_dict['diametro_pupillare_medio'] = (PUPIL_COL_NAME, 'mean')
-        
-        if 'excursion_success' in df_center_out.columns:
-            agg_dict['excursion_success_perc'] = ('excursion_success', 'mean')
-        if 'excursion_perc_frames' in df_center_out.columns:
-            agg_dict['avg_excursion_perc_frames'] = ('excursion_perc_frames', 'mean')
-        if 'directional_excursion_success' in df_center_out.columns:
-            agg_dict['directional_excursion_success_perc'] = ('directional_excursion_success', 'mean')
-
-        summary = df_center_out.groupby('direction_simple').agg(**agg_dict).reset_index()
-        summary['avg_gaze_in_box_perc'] *= 100
-        if 'directional_excursion_success_perc' in summary: summary['directional_excursion_success_perc'] *= 100
-        if 'excursion_success_perc' in summary: summary['excursion_success_perc'] *= 100
-        
+        summary = segment_summaries[segment_name]
         summary.to_excel(writer, sheet_name=f"Riepilogo_{segment_name}", index=False)
         df_center_out.to_excel(writer, sheet_name=f"Dettagli_{segment_name}", index=False)
 
-        gen_sum = {
-            'segmento': segment_name,
-            'gaze_in_box_perc_totale': df_center_out['gaze_in_box'].mean() * 100,
-            'velocita_sguardo_media': df_center_out['gaze_speed'].mean(),
-            'numero_trial_validi': df_center_out['trial_id'].nunique()
-        }
-        if PUPIL_COL_NAME in df_center_out.columns and df_center_out[PUPIL_COL_NAME].notna().any():
-            gen_sum['diametro_pupillare_medio'] = df_center_out[PUPIL_COL_NAME].mean()
-        if 'excursion_success' in df_center_out.columns:
-            gen_sum['escursione_successo_perc'] = df_center_out['excursion_success'].mean() * 100
-        if 'directional_excursion_success' in df_center_out.columns:
-            gen_sum['escursione_direzionale_successo_perc'] = df_center_out['directional_excursion_success'].mean() * 100
-        general_summary_list.append(gen_sum)
-
         for direction in summary['direction_simple'].unique():
             df_dir = df_center_out[df_center_out['direction_simple'] == direction]
             generate_gaze_heatmap(df_dir, w, h, os.path.join(plot_dir, f"heatmap_{segment_name}_{direction}.png"))
@@ -482,6 +682,14 @@ def main(args):
 
     if general_summary_list:
         pd.DataFrame(general_summary_list).to_excel(writer, sheet_name="Riepilogo_Generale", index=False)
+
+    if getattr(args, 'run_threshold_sweep', False) and not trial_stats.empty:
+        print("\nINFO: Analisi di sensibilità delle soglie di escursione...")
+        sweep = sweep_excursion_thresholds(
+            trial_stats,
+            getattr(args, 'sweep_success_thresholds', DEFAULT_SWEEP_SUCCESS_THRESHOLDS),
+            getattr(args, 'sweep_edge_thresholds', DEFAULT_SWEEP_EDGE_THRESHOLDS))
+        sweep.to_excel(writer, sheet_name="Analisi_Soglie", index=False)
     
     writer.close()
 
@@ -2,6 +2,8 @@ import cv2
 import numpy as np
 import pandas as pd
 import os
+from video_utils import SequentialFrameReader, HomographyCache
+import data_loader
 
 def draw_text(img, text, pos, font_scale=0.6, color=(255, 255, 255), thickness=1, bg_color=None):
     """Disegna testo con un possibile sfondo per una migliore leggibilità."""
@@ -31,14 +33,13 @@ def main(args):
         raise FileNotFoundError(f"File posizioni superficie non trovato: {args.surface_positions}")
 
     df_analysis = pd.read_csv(args.analysis_csv)
-    df_surface = pd.read_csv(args.surface_positions)
-    if 'world_index' not in df_surface.columns:
-        df_surface['world_index'] = df_surface.index
+    df_surface = data_loader.load_surface_positions(args.surface_positions)
 
     # Unisci i dati di analisi con le posizioni della superficie
     df_merged = pd.merge(df_analysis, df_surface, left_on='frame', right_on='world_index', how='left')
 
-    cap = cv2.VideoCapture(args.input_video)
+    # Lettura sequenziale: un seek solo quando i frame del segmento non sono contigui
+    cap = SequentialFrameReader(args.input_video)
     if not cap.isOpened():
         raise IOError(f"Impossibile aprire il video {args.input_video}")
     fps = cap.get(cv2.CAP_PROP_FPS)
@@ -52,13 +53,13 @@ def main(args):
 
         # Imposta il video writer (le dimensioni sono determinate al primo frame valido)
         out = None
+        homography = None
         output_video_path = os.path.join(args.output_dir, f"final_video_{segment_name}.mp4")
 
         # Itera su ogni frame del segmento
         for _, row in segment_df.iterrows():
             frame_idx = int(row['frame'])
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-            ret, original_frame = cap.read()
+            ret, original_frame = cap.read(frame_idx)
             if not ret:
                 continue
 
@@ -76,10 +77,11 @@ def main(args):
                     if output_width <= 0 or output_height <= 0: continue
                     fourcc = cv2.VideoWriter.fourcc(*'mp4v')
                     out = cv2.VideoWriter(output_video_path, fourcc, fps, (output_width, output_height))
+                    homography = HomographyCache((output_width, output_height),
+                                                 tolerance_px=getattr(args, 'homography_tolerance_px', 0.5),
+                                                 use_remap=getattr(args, 'use_remap_tables', False))
 
-                dst_pts = np.array([[0, 0], [output_width - 1, 0], [output_width - 1, output_height - 1], [0, output_height - 1]], dtype=np.float32)
-                matrix = cv2.getPerspectiveTransform(src_pts, dst_pts)
-                warped_frame = cv2.warpPerspective(original_frame, matrix, (output_width, output_height))
+                warped_frame = homography.warp(original_frame, src_pts)
             except Exception:
                 continue
 
@@ -136,6 +138,7 @@ def main(args):
         if out:
             out.release()
             print(f"  -> Video con overlay salvato in: '{output_video_path}'")
+            print(f"  {homography.stats_message(segment_name)}")
 
     cap.release()
     cv2.destroyAllWindows()
@@ -0,0 +1,36 @@
+import numpy as np
+
+
+def assign_intervals(values, starts, ends):
+    """
+    Per ogni valore (es. numero di frame) ritorna l'indice dell'intervallo chiuso [start, end]
+    che lo contiene, oppure -1 se nessun intervallo lo contiene.
+
+    Con intervalli disgiunti basta una ricerca binaria sugli inizi ordinati (O(N log E)).
+    Se gli intervalli si sovrappongono vince l'ultimo in ordine, come quando le maschere
+    venivano applicate una dopo l'altra: in quel caso (raro) si ricade sull'applicazione in ordine.
+    """
+    values = np.asarray(values, dtype=float)
+    starts = np.asarray(starts, dtype=float)
+    ends = np.asarray(ends, dtype=float)
+    result = np.full(len(values), -1, dtype=np.int64)
+
+    valid = np.flatnonzero(~np.isnan(starts) & ~np.isnan(ends) & (starts <= ends))
+    if len(valid) == 0:
+        return result
+    order = valid[np.argsort(starts[valid], kind='stable')]
+    sorted_starts, sorted_ends = starts[order], ends[order]
+
+    if np.all(sorted_starts[1:] > sorted_ends[:-1]):
+        pos = np.searchsorted(sorted_starts, values, side='right') - 1
+        hit = (pos >= 0) & (values <= sorted_ends[np.maximum(pos, 0)])
+        result[hit] = order[pos[hit]]
+    else:
+        for k in valid:
+            result[(values >= starts[k]) & (values <= ends[k])] = k
+    return result
+
+
+def lookup_labels(indices, labels, default=''):
+    """Converte gli indici di `assign_intervals` nelle etichette corrispondenti (`default` per -1)."""
+    return np.append(np.asarray(labels, dtype=object), default).astype(object)[indices]
@@ -16,9 +16,29 @@ import trim_video
 import detect_and_save_ball
 import generate_report
 import generate_video
+import data_loader
 # MODIFICA: Importa entrambe le classi dal selettore interattivo
 from interactive_selector import InteractiveVideoSelector, SingleFrameSelector
 from file_organizer import organize_files
+from pipeline_cache import StageCache, read_stage_params
+import model_registry
+
+# Parametri di 'analysis_parameters.csv' che influenzano i risultati del rilevamento:
+# se cambiano solo gli altri (es. le soglie del report), il rilevamento non viene ripetuto.
+DETECTION_STAGE_PARAMS = [
+    'padding_box_inseguimento_perc', 'metodo_rilevamento_palla', 'modello_yolo',
+    'risoluzione_rilevamento_perc', 'tracking_palla_attivo',
+]
+
+# Parametri che influenzano il report oltre alle soglie di escursione: se cambiano solo le soglie,
+# il report viene aggiornato dalle statistiche per trial invece di essere rigenerato da zero.
+REPORT_STAGE_PARAMS = [
+    'analisi_frammentazione_attiva', 'analisi_escursione_attiva', 'analisi_sensibilita_soglie',
+]
+
+# Valore iniziale dell'opzione della GUI che carica in background i modelli (EasyOCR e/o YOLO)
+# usati dall'analisi configurata, così la prima analisi non attende il loro caricamento.
+PREWARM_MODELS_ON_START = False
 
 class StdoutRedirector:
     # ... (questa classe rimane invariata)
@@ -108,11 +128,19 @@ class MainApp(ctk.CTk):
         self.detection_method = ctk.StringVar(value="Hough Circle")
         self.run_fragmentation_analysis = ctk.BooleanVar(value=False)
         self.run_excursion_analysis = ctk.BooleanVar(value=False)
+        self.use_ball_tracker = ctk.BooleanVar(value=False)
+        self.run_threshold_sweep = ctk.BooleanVar(value=False)
+        self.use_template_cue_detector = ctk.BooleanVar(value=False)
+        self.cue_template_frame = ctk.StringVar() # Frame (scelto dall'utente) da cui ricavare il modello del numero '1'
+        self.prewarm_models = ctk.BooleanVar(value=PREWARM_MODELS_ON_START)
         self.manual_events_path = ctk.StringVar()
         self.fast_start_frame = ctk.StringVar()
         self.bbox_padding_perc = ctk.StringVar(value="20") # Default 20%
         self.directional_excursion_threshold_perc = ctk.StringVar(value="15") # Default 15%
         self.excursion_threshold_perc = ctk.StringVar(value="80") # Default 80%
+        self.detection_scale_perc = ctk.StringVar(value="100") # Risoluzione di rilevamento (100% = piena)
+        self.yolo_batch_size = ctk.StringVar(value="8") # Frame per singola chiamata YOLO
+        self.detection_workers = ctk.StringVar(value=str(max(1, (os.cpu_count() or 1) - 1))) # Default: tutti i core tranne uno
         self.fast_end_frame = ctk.StringVar()
         self.slow_start_frame = ctk.StringVar()
         self.slow_end_frame = ctk.StringVar()
@@ -132,7 +160,7 @@ class MainApp(ctk.CTk):
         self.auto_detection_frame.grid(row=3, column=0, columnspan=3, sticky="ew", padx=5, pady=5)
         self.auto_detection_frame.grid_columnconfigure(1, weight=1)
         ctk.CTkLabel(self.auto_detection_frame, text="3. Metodo Rilevamento Palla:").grid(row=0, column=0, padx=10, pady=10, sticky="w")
-        ctk.CTkSegmentedButton(self.auto_detection_frame, values=["YOLO", "Hough Circle"], variable=self.detection_method, command=self.check_inputs_callback).grid(row=0, column=1, columnspan=2, padx=10, pady=10, sticky="w")
+        ctk.CTkSegmentedButton(self.auto_detection_frame, values=["YOLO", "Hough Circle"], variable=self.detection_method, command=self.on_detection_method_changed).grid(row=0, column=1, columnspan=2, padx=10, pady=10, sticky="w")
         self.yolo_label = ctk.CTkLabel(self.auto_detection_frame, text="4. Modello YOLO (.pt):")
         self.yolo_label.grid(row=1, column=0, padx=10, pady=10, sticky="w")
         self.yolo_path_entry = ctk.CTkEntry(self.auto_detection_frame, textvariable=self.yolo_model_path)
@@ -184,11 +212,26 @@ class MainApp(ctk.CTk):
         ctk.CTkLabel(params_frame, text="Soglia Bordo Esc. Direzionale (%):").grid(row=3, column=0, padx=10, pady=5, sticky="w")
         ctk.CTkEntry(params_frame, textvariable=self.directional_excursion_threshold_perc, width=80).grid(row=3, column=1, padx=10, pady=5, sticky="w")
 
+        ctk.CTkLabel(params_frame, text="Processi Paralleli Rilevamento (Hough):").grid(row=4, column=0, padx=10, pady=5, sticky="w")
+        ctk.CTkEntry(params_frame, textvariable=self.detection_workers, width=80).grid(row=4, column=1, padx=10, pady=5, sticky="w")
+
+        ctk.CTkLabel(params_frame, text="Risoluzione Rilevamento (%):").grid(row=5, column=0, padx=10, pady=5, sticky="w")
+        ctk.CTkEntry(params_frame, textvariable=self.detection_scale_perc, width=80).grid(row=5, column=1, padx=10, pady=5, sticky="w")
+
+        ctk.CTkLabel(params_frame, text="Dimensione Batch YOLO (frame):").grid(row=6, column=0, padx=10, pady=5, sticky="w")
+        ctk.CTkEntry(params_frame, textvariable=self.yolo_batch_size, width=80).grid(row=6, column=1, padx=10, pady=5, sticky="w")
+
         analyses_frame = ctk.CTkFrame(main_frame)
         analyses_frame.grid(row=6, column=0, columnspan=3, sticky="ew", padx=5, pady=5)
         ctk.CTkLabel(analyses_frame, text="Analisi Aggiuntive:", font=ctk.CTkFont(weight="bold")).pack(anchor="w", padx=10, pady=(10,0))
         ctk.CTkCheckBox(analyses_frame, text="Genera grafici 'Frammentazione'", variable=self.run_fragmentation_analysis).pack(anchor="w", padx=25, pady=2)
-        ctk.CTkCheckBox(analyses_frame, text="Calcola metriche 'Escursione' e 'Escursione Direzionale'", variable=self.run_excursion_analysis).pack(anchor="w", padx=25, pady=(2,10))
+        ctk.CTkCheckBox(analyses_frame, text="Calcola metriche 'Escursione' e 'Escursione Direzionale'", variable=self.run_excursion_analysis).pack(anchor="w", padx=25, pady=2)
+        ctk.CTkCheckBox(analyses_frame, text="Analisi di sensibilità delle soglie di escursione (foglio Excel)", variable=self.run_threshold_sweep).pack(anchor="w", padx=25, pady=2)
+        ctk.CTkCheckBox(analyses_frame, text="Tracking palla: cerca attorno alla posizione prevista (solo Hough)", variable=self.use_ball_tracker).pack(anchor="w", padx=25, pady=2)
+        ctk.CTkCheckBox(analyses_frame, text="Ricerca del numero '1' per modello della cifra (senza OCR, più veloce)", variable=self.use_template_cue_detector,
+                        command=self.on_template_cue_toggled).pack(anchor="w", padx=25, pady=2)
+        ctk.CTkCheckBox(analyses_frame, text="Pre-carica in background i modelli usati dall'analisi (EasyOCR/YOLO)", variable=self.prewarm_models,
+                        command=self.prewarm_configured_models).pack(anchor="w", padx=25, pady=(2,10))
 
         console_frame = ctk.CTkFrame(container)
         console_frame.grid(row=2, column=0, sticky="nsew", padx=10, pady=10)
@@ -207,6 +250,7 @@ class MainApp(ctk.CTk):
         
         self.check_hardware_acceleration()
         self.check_inputs()
+        self.prewarm_configured_models()
 
     def run_organizer(self):
         source_dir = filedialog.askdirectory(
@@ -535,6 +579,25 @@ class MainApp(ctk.CTk):
     def check_inputs_callback(self, *args):
         self.check_inputs()
 
+    def on_detection_method_changed(self, *args):
+        self.check_inputs()
+        self.prewarm_configured_models()
+
+    def prewarm_configured_models(self):
+        """
+        Se l'opzione è attiva, carica in background solo i modelli che l'analisi configurata userà:
+        EasyOCR se i segmenti verranno cercati con l'OCR, YOLO se è il metodo di rilevamento scelto.
+        """
+        if not self.prewarm_models.get():
+            return
+        segment_fields = [self.fast_start_frame.get(), self.fast_end_frame.get(), self.slow_start_frame.get(), self.slow_end_frame.get()]
+        use_manual_segments = all(v.isdigit() for v in segment_fields)
+        use_template_cue = self.use_template_cue_detector.get() and self.cue_template_frame.get()
+        needs_easyocr = not use_manual_segments and not use_template_cue
+        yolo_path = self.yolo_model_path.get() if self.detection_method.get() == "YOLO" else None
+        if needs_easyocr or (yolo_path and os.path.isfile(yolo_path)):
+            model_registry.prewarm_in_background(easyocr=needs_easyocr, yolo_model_path=yolo_path)
+
     def check_inputs(self):
         input_ok = os.path.isdir(self.input_dir.get())
         output_ok = os.path.isdir(self.output_dir.get())
@@ -582,7 +645,14 @@ class MainApp(ctk.CTk):
                 'metodo_rilevamento_palla': self.detection_method.get(),
                 'modello_yolo': self.yolo_model_path.get() if self.detection_method.get() == "YOLO" else 'N/A',
                 'analisi_frammentazione_attiva': self.run_fragmentation_analysis.get(),
-                'analisi_escursione_attiva': self.run_excursion_analysis.get()
+                'analisi_escursione_attiva': self.run_excursion_analysis.get(),
+                'analisi_sensibilita_soglie': self.run_threshold_sweep.get(),
+                'processi_paralleli_rilevamento': self.detection_workers.get(),
+                'risoluzione_rilevamento_perc': self.detection_scale_perc.get(),
+                'tracking_palla_attivo': self.use_ball_tracker.get(),
+                'rilevatore_numero_1': 'modello' if self.use_template_cue_detector.get() else 'OCR',
+                'frame_modello_numero_1': self.cue_template_frame.get() or 'N/A',
+                'batch_yolo': self.yolo_batch_size.get() if self.detection_method.get() == "YOLO" else 'N/A'
             }
             
             with open(params_path, 'w', newline='') as f:
@@ -591,6 +661,10 @@ class MainApp(ctk.CTk):
                 for key, value in analysis_params.items():
                     writer.writerow([key, value])
             print(f"INFO: Parametri salvati in '{params_path}'\n")
+
+            # Cache delle fasi: OCR e rilevamento vengono saltati se input e parametri non sono cambiati
+            stage_cache = StageCache(self.output_dir.get())
+            input_video_path = os.path.join(self.input_dir.get(), 'video.mp4')
             
             # Determina se usare i segmenti manuali o automatici
             use_manual_segments = False
@@ -610,13 +684,30 @@ class MainApp(ctk.CTk):
                     writer.writerow(['slow', self.slow_start_frame.get(), self.slow_end_frame.get()])
                 print("'cut_points.csv' creato con successo.")
             else:
-                print("Modalità automatica segmenti: avvio ricerca OCR in 'trim_video.py'...")
                 args_trim = SimpleNamespace(
-                    input_video=os.path.join(self.input_dir.get(), 'video.mp4'),
-                    output_dir=self.output_dir.get()
+                    input_video=input_video_path,
+                    output_dir=self.output_dir.get(),
+                    # Ricerca del numero '1' su una griglia sparsa + bisezione ('sequential' = frame per frame)
+                    onset_search='coarse',
+                    # Filtro rapido che salta l'OCR sui frame senza possibili cifre o invariati
+                    ocr_prefilter=True,
+                    # Frame riconosciuti insieme in una sola chiamata OCR a batch (1 = executor a 3 thread)
+                    ocr_batch_size=trim_video.OCR_BATCH_SIZE,
+                    # 'template' = correlazione con la cifra ricavata dal frame scelto dall'utente invece di EasyOCR
+                    cue_detector='template' if self.use_template_cue_detector.get() and self.cue_template_frame.get() else 'ocr',
+                    cue_template_frame=int(self.cue_template_frame.get()) if self.cue_template_frame.get() else None
                 )
-                # Esegui la ricerca automatica. Se fallisce (ritorna False), gestisci l'interfaccia manuale nel thread principale.
-                auto_success = trim_video.main(args_trim)
+                trim_key = stage_cache.compute_key([input_video_path], {'cue_detector': args_trim.cue_detector,
+                                                                        'cue_template_frame': args_trim.cue_template_frame})
+                if stage_cache.is_valid('trim', trim_key):
+                    print("INFO: Video invariato: riuso 'cut_points.csv' dall'esecuzione precedente (ricerca OCR saltata).")
+                    auto_success = True
+                else:
+                    print("Modalità automatica segmenti: avvio ricerca OCR in 'trim_video.py'...")
+                    # Esegui la ricerca automatica. Se fallisce (ritorna False), gestisci l'interfaccia manuale nel thread principale.
+                    auto_success = trim_video.main(args_trim)
+                    if auto_success:
+                        stage_cache.record('trim', trim_key, [cut_points_path])
                 if not auto_success:
                     self.after(0, self.prompt_manual_trim_selection, args_trim)
                     # L'analisi non può continuare finché l'utente non seleziona i frame.
@@ -633,9 +724,28 @@ class MainApp(ctk.CTk):
                 use_yolo=(self.detection_method.get() == "YOLO"),
                 yolo_model=self.yolo_model_path.get(),
                 # Aggiungo il nuovo parametro per il padding
-                bbox_padding_factor=1.0 + (float(self.bbox_padding_perc.get()) / 100.0)
+                bbox_padding_factor=1.0 + (float(self.bbox_padding_perc.get()) / 100.0),
+                # Numero di processi per il rilevamento Hough (1 = esecuzione seriale)
+                workers=max(1, int(self.detection_workers.get() or 1)),
+                # Numero di frame raddrizzati analizzati in una singola chiamata YOLO
+                yolo_batch_size=max(1, int(self.yolo_batch_size.get() or 1)),
+                # Scala del frame raddrizzato usato per il rilevamento (1.0 = piena risoluzione)
+                detection_scale=min(1.0, float(self.detection_scale_perc.get() or 100) / 100.0),
+                # Ricerca della palla in una finestra attorno alla posizione prevista
+                use_tracker=self.use_ball_tracker.get()
             )
-            detect_and_save_ball.main(args_detect)
+            detect_inputs = [input_video_path] + [
+                os.path.join(self.input_dir.get(), name) for name in ('gaze.csv', 'surface_positions.csv', 'world_timestamps.csv')
+            ] + [cut_points_path, os.path.join(self.output_dir.get(), 'manual_events_fixed.csv')]
+            if args_detect.use_yolo:
+                detect_inputs.append(args_detect.yolo_model)
+            detect_key = stage_cache.compute_key(detect_inputs, read_stage_params(params_path, DETECTION_STAGE_PARAMS))
+            detect_output_path = os.path.join(self.output_dir.get(), 'output_final_analysis_analysis.csv')
+            if stage_cache.is_valid('detect', detect_key):
+                print("INFO: Input e parametri di rilevamento invariati: riuso i risultati precedenti (rilevamento saltato).")
+            else:
+                detect_and_save_ball.main(args_detect)
+                stage_cache.record('detect', detect_key, [detect_output_path])
 
             print("\n--- Avvio 'generate_report.py' ---")
             # Determina se usare il file di eventi manuali
@@ -648,12 +758,24 @@ class MainApp(ctk.CTk):
                 input_dir_for_pupil=self.input_dir.get(),
                 run_fragmentation_analysis=self.run_fragmentation_analysis.get(),
                 run_excursion_analysis=self.run_excursion_analysis.get(),
+                run_threshold_sweep=self.run_threshold_sweep.get(),
                 manual_events_path=manual_events_file,
                 # Aggiungo i nuovi parametri per le soglie
                 excursion_success_threshold=float(self.excursion_threshold_perc.get()) / 100.0,
                 directional_excursion_edge_threshold=float(self.directional_excursion_threshold_perc.get()) / 100.0
             )
-            generate_report.main(args_report)
+            report_inputs = [detect_output_path, cut_points_path, manual_events_file, input_video_path] + [
+                os.path.join(self.input_dir.get(), name) for name in ('world_timestamps.csv', '3d_eye_states.csv')
+            ]
+            report_key = stage_cache.compute_key(report_inputs, read_stage_params(params_path, REPORT_STAGE_PARAMS))
+            report_outputs = [os.path.join(self.output_dir.get(), name) for name in
+                              ('final_report.xlsx', generate_report.TRIAL_STATISTICS_FILENAME, 'output_final_analysis_with_metrics.csv')]
+            if stage_cache.is_valid('report', report_key):
+                print("INFO: Dati e opzioni del report invariati: aggiorno solo le metriche che dipendono dalle soglie.")
+                generate_report.update_threshold_metrics(args_report)
+            else:
+                generate_report.main(args_report)
+            stage_cache.record('report', report_key, report_outputs)
             
             # --- NUOVO: FASE 3 - Generazione Video con Overlay ---
             args_video = SimpleNamespace(
@@ -673,6 +795,9 @@ class MainApp(ctk.CTk):
             print(f"\n====== ERRORE DURANTE L'ANALISI ======\n{e}")
             traceback.print_exc()
         finally:
+            # Le tabelle lette servono solo a questa analisi: la memoria viene liberata
+            # (la cache binaria su disco resta disponibile per le analisi successive)
+            data_loader.clear_cache()
             self.after(0, self.analysis_finished, success, error_message)
 
     def prompt_manual_trim_selection(self, args_trim):
@@ -698,7 +823,34 @@ class MainApp(ctk.CTk):
 
     def select_input_dir(self):
         path = filedialog.askdirectory(title="Seleziona cartella input")
-        if path: self.input_dir.set(path)
+        if path:
+            if path != self.input_dir.get():
+                # Il frame scelto come modello del numero '1' si riferisce al video precedente
+                self.use_template_cue_detector.set(False)
+                self.cue_template_frame.set("")
+            self.input_dir.set(path)
+
+    def on_template_cue_toggled(self):
+        """
+        Il rilevamento per modello richiede un frame in cui il numero '1' è visibile: la cifra
+        viene ricavata da quel frame, quindi corrisponde al carattere della registrazione.
+        """
+        self.cue_template_frame.set("")
+        if not self.use_template_cue_detector.get():
+            return
+        video_path = os.path.join(self.input_dir.get(), 'video.mp4')
+        if not os.path.isfile(video_path):
+            messagebox.showwarning("Video Mancante", "Seleziona prima la cartella di input con il file 'video.mp4'.")
+            self.use_template_cue_detector.set(False)
+            return
+        selector = SingleFrameSelector(self, video_path, title="Seleziona un frame in cui è visibile il numero '1'")
+        self.wait_window(selector)
+        if selector.result is None:
+            print("INFO: Nessun frame scelto: la ricerca del numero '1' userà l'OCR.")
+            self.use_template_cue_detector.set(False)
+            return
+        self.cue_template_frame.set(str(selector.result))
+        print(f"INFO: Modello del numero '1' ricavato dal frame {selector.result}.")
 
     def select_output_dir(self):
         path = filedialog.askdirectory(title="Seleziona cartella output")
@@ -706,7 +858,9 @@ class MainApp(ctk.CTk):
 
     def select_yolo_model(self):
         path = filedialog.askopenfilename(title="Seleziona modello YOLO", filetypes=[("YOLO Model", "*.pt")])
-        if path: self.yolo_model_path.set(path)
+        if path:
+            self.yolo_model_path.set(path)
+            self.prewarm_configured_models()
 
     def analysis_finished(self, success, error_message):
         """Chiamato quando il thread di analisi finisce. Mostra il risultato e resetta la GUI."""
@@ -730,6 +884,7 @@ class MainApp(ctk.CTk):
         self.slow_end_frame.set("")
         self.run_fragmentation_analysis.set(False)
         self.run_excursion_analysis.set(False)
+        self.run_threshold_sweep.set(False)
         print("INFO: Campi di input e parametri resettati.")
         self.check_inputs() # Aggiorna lo stato del pulsante "Avvia"
 
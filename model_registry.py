@@ -0,0 +1,83 @@
+import os
+import threading
+
+"""
+Registro dei modelli condiviso da tutto il processo (lettore EasyOCR e modelli YOLO).
+
+Ogni modello viene caricato solo alla prima richiesta e poi mantenuto in memoria: le analisi
+successive avviate dalla stessa sessione della GUI lo riusano invece di ricaricarlo da disco.
+Il caricamento è protetto da un lock per modello, quindi una richiesta che arriva mentre il
+modello si sta ancora caricando (ad esempio durante il pre-caricamento in background) attende
+quel caricamento invece di ripeterlo. Le librerie (easyocr, ultralytics) vengono importate
+solo quando servono.
+"""
+
+_MODELS = {}
+_LOAD_LOCKS = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def _get_or_load(key, loader):
+    with _REGISTRY_LOCK:
+        load_lock = _LOAD_LOCKS.setdefault(key, threading.Lock())
+    with load_lock:
+        if key not in _MODELS:
+            _MODELS[key] = loader()
+        return _MODELS[key]
+
+
+def get_easyocr_reader(languages=('en',)):
+    """Lettore EasyOCR condiviso (GPU se disponibile, altrimenti CPU)."""
+    def load():
+        import easyocr
+        try:
+            reader = easyocr.Reader(list(languages), gpu=True)
+            print("EasyOCR inizializzato con GPU.")
+        except Exception:
+            print("GPU non disponibile per EasyOCR, ripiego su CPU (potrebbe essere più lento).")
+            reader = easyocr.Reader(list(languages), gpu=False)
+        return reader
+
+    return _get_or_load(('easyocr', tuple(languages)), load)
+
+
+def get_yolo_model(model_path):
+    """
+    Modello YOLO condiviso per il file `model_path`. La chiave include la data di modifica del
+    file, quindi dei pesi sostituiti su disco vengono ricaricati.
+    """
+    abs_path = os.path.abspath(model_path)
+
+    def load():
+        from ultralytics import YOLO
+        print(f"Caricamento del modello YOLOv8 da {model_path}...")
+        return YOLO(model_path)
+
+    return _get_or_load(('yolo', abs_path, os.stat(abs_path).st_mtime_ns), load)
+
+
+def prewarm_in_background(easyocr=True, yolo_model_path=None):
+    """
+    Carica i modelli indicati in un thread in background (daemon), così la prima analisi non
+    attende il caricamento. Gli errori vengono solo segnalati: il modello verrà ricaricato
+    (e l'eventuale errore sollevato) alla prima richiesta effettiva. Ritorna il thread avviato.
+    """
+    def run():
+        try:
+            if easyocr:
+                get_easyocr_reader()
+            if yolo_model_path and os.path.isfile(yolo_model_path):
+                get_yolo_model(yolo_model_path)
+            print("INFO: Pre-caricamento dei modelli completato.")
+        except Exception as e:
+            print(f"ATTENZIONE: Pre-caricamento dei modelli non riuscito ({e}). Verranno caricati all'avvio dell'analisi.")
+
+    thread = threading.Thread(target=run, name="model-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+def clear():
+    """Libera tutti i modelli caricati."""
+    with _REGISTRY_LOCK:
+        _MODELS.clear()
@@ -0,0 +1,189 @@
+import os
+import json
+import hashlib
+import csv
+
+
+def file_fingerprint(path, sample_bytes=1 << 20):
+    """
+    Impronta economica di un file: dimensione, data di modifica e hash SHA-1 del primo e
+    dell'ultimo MB. Sufficiente a riconoscere se un file di input è cambiato tra due esecuzioni
+    senza rileggere per intero video da centinaia di MB.
+    """
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        sha1.update(f.read(sample_bytes))
+        if stat.st_size > sample_bytes:
+            f.seek(max(sample_bytes, stat.st_size - sample_bytes))
+            sha1.update(f.read(sample_bytes))
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1_head_tail': sha1.hexdigest()}
+
+
+def _write_json_atomic(path, data):
+    # Scrittura su file temporaneo + rename: un'interruzione non lascia mai un JSON a metà
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class DetectionCheckpoint:
+    """
+    Checkpoint del rilevamento salvato nella cartella di output.
+
+    Contiene l'impronta degli input e dei parametri di rilevamento, l'ultimo frame completato
+    per ogni segmento e il piano di rilevamento Hough (blocchi di frame con i rispettivi parametri),
+    così la ripresa non ripete la ricerca dei parametri. Se alla riesecuzione l'impronta
+    coincide, il rilevamento riprende dall'ultimo frame salvato (o viene saltato del tutto
+    se era già stato completato).
+    """
+
+    FILENAME = 'detection_checkpoint.json'
+
+    def __init__(self, output_dir, fingerprint):
+        self.path = os.path.join(output_dir, self.FILENAME)
+        self.fingerprint = fingerprint
+        self.segments = {}
+        self.plan = None
+        self.completed = False
+
+    def load(self):
+        """Carica il checkpoint esistente. Ritorna True solo se corrisponde agli input attuali."""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"ATTENZIONE: Checkpoint di rilevamento illeggibile ({e}). Verrà ignorato.")
+            return False
+        if data.get('fingerprint') != self.fingerprint:
+            print("INFO: Input o parametri di rilevamento modificati: il checkpoint precedente non è valido.")
+            return False
+        self.segments = data.get('segments', {})
+        self.plan = data.get('plan')
+        self.completed = data.get('completed', False)
+        return True
+
+    def reset(self):
+        self.segments = {}
+        self.plan = None
+        self.completed = False
+        self.save()
+
+    @property
+    def last_frame(self):
+        return max(self.segments.values()) if self.segments else None
+
+    def record_chunk(self, chunk):
+        """Aggiorna l'ultimo frame completato per segmento dopo la scrittura di un blocco di risultati."""
+        for segment_name, last_frame in chunk.groupby('segment_name')['frame'].max().items():
+            self.segments[str(segment_name)] = int(last_frame)
+        self.save()
+
+    def record_plan(self, plan):
+        self.plan = [list(block) for block in plan]
+        self.save()
+
+    def mark_completed(self):
+        self.completed = True
+        self.save()
+
+    def save(self):
+        _write_json_atomic(self.path, {
+            'fingerprint': self.fingerprint,
+            'segments': self.segments,
+            'plan': self.plan,
+            'completed': self.completed,
+        })
+
+
+def read_stage_params(params_path, keys):
+    """Legge da 'analysis_parameters.csv' i soli parametri che influenzano una fase della pipeline."""
+    params = {}
+    if os.path.exists(params_path):
+        with open(params_path, newline='') as f:
+            for row in csv.DictReader(f):
+                if row['parametro'] in keys:
+                    params[row['parametro']] = row['valore']
+    return params
+
+
+class StageCache:
+    """
+    Cache delle fasi della pipeline indirizzata per contenuto.
+
+    Per ogni fase viene salvata in 'stage_cache.json' una chiave calcolata dagli hash SHA-1
+    dei file di input e dai parametri della fase, insieme all'impronta dei file prodotti.
+    Una fase può essere saltata se la chiave coincide e i suoi output non sono stati
+    cancellati o modificati nel frattempo. Gli hash completi dei file vengono memorizzati
+    (per percorso, dimensione e data di modifica) per non rileggere il video a ogni esecuzione.
+    """
+
+    FILENAME = 'stage_cache.json'
+
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, self.FILENAME)
+        self.stages = {}
+        self.file_hashes = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    data = json.load(f)
+                self.stages = data.get('stages', {})
+                self.file_hashes = data.get('file_hashes', {})
+            except (OSError, ValueError) as e:
+                print(f"ATTENZIONE: Cache delle fasi illeggibile ({e}). Verrà ricreata.")
+
+    def content_hash(self, path):
+        """Hash SHA-1 dell'intero contenuto del file (None se il file non esiste)."""
+        if not path or not os.path.exists(path):
+            return None
+        abs_path = os.path.abspath(path)
+        stat = os.stat(abs_path)
+        cached = self.file_hashes.get(abs_path)
+        if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+            return cached['sha1']
+        sha1 = hashlib.sha1()
+        with open(abs_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha1.update(block)
+        self.file_hashes[abs_path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': sha1.hexdigest()}
+        return sha1.hexdigest()
+
+    def compute_key(self, input_paths, params):
+        payload = {
+            'inputs': {os.path.basename(path): self.content_hash(path) for path in input_paths if path},
+            'params': params,
+        }
+        return hashlib.sha1(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def is_valid(self, stage, key):
+        entry = self.stages.get(stage)
+        if not entry or entry['key'] != key:
+            return False
+        # Un output registrato senza impronta (file mancante) non rende mai valida la fase
+        return all(fingerprint is not None and file_fingerprint(path) == fingerprint
+                   for path, fingerprint in entry['outputs'].items())
+
+    def record(self, stage, key, output_paths):
+        """Registra la fase come completata. Se un output non esiste la fase non viene registrata."""
+        outputs = {path: file_fingerprint(path) for path in output_paths}
+        missing = [path for path, fingerprint in outputs.items() if fingerprint is None]
+        if missing:
+            print(f"ATTENZIONE: Output della fase '{stage}' non trovati ({', '.join(missing)}): la fase non viene memorizzata nella cache.")
+            self.invalidate(stage)
+            return False
+        self.stages[stage] = {'key': key, 'outputs': outputs}
+        self.save()
+        return True
+
+    def invalidate(self, stage):
+        if self.stages.pop(stage, None) is not None:
+            self.save()
+
+    def save(self):
+        _write_json_atomic(self.path, {'stages': self.stages, 'file_hashes': self.file_hashes})
@@ -0,0 +1,129 @@
+import os
+import numpy as np
+import pandas as pd
+
+# pyarrow è opzionale: senza di esso l'output Parquet viene semplicemente disattivato
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa, pq = None, None
+
+
+class StreamingResultWriter:
+    """
+    Scrive i risultati per frame su disco a blocchi invece di tenerli tutti in memoria.
+
+    Le righe vengono accumulate in buffer di colonne con tipo fisso (`columns` è un dizionario
+    ordinato nome -> dtype pandas) e scritte in append sul CSV ogni `flush_every` righe, così
+    un'interruzione a metà registrazione perde al massimo un blocco. Opzionalmente ogni
+    blocco viene scritto anche come row group di un file Parquet (richiede pyarrow).
+    `on_flush`, se indicato, viene chiamata con ogni blocco dopo che è stato scritto.
+    """
+
+    def __init__(self, csv_path, columns, flush_every=500, parquet_path=None, resume=False, on_flush=None):
+        self.csv_path = csv_path
+        self.columns = dict(columns)
+        self.flush_every = max(1, int(flush_every))
+        self.parquet_path = parquet_path if pq is not None else None
+        if parquet_path and pq is None:
+            print("ATTENZIONE: pyarrow non installato, l'output Parquet sarà saltato.")
+        self.on_flush = on_flush
+        self._parquet_writer = None
+        self._buffers = {name: [] for name in self.columns}
+        self.rows_written = 0
+        self.last_flushed_frame = None
+
+        if resume:
+            self.last_flushed_frame = self._recover_existing_output()
+        else:
+            self._remove_existing_output()
+
+    def _remove_existing_output(self):
+        for path in (self.csv_path, self.parquet_path):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    def _recover_existing_output(self):
+        """
+        Prepara la ripresa da un CSV scritto in precedenza: scarta un'eventuale riga troncata
+        da un'interruzione e ritorna l'ultimo frame scritto (None se non c'è nulla da riprendere).
+        """
+        # Il Parquet non supporta l'append tra sessioni diverse: viene ricreato a partire dal CSV
+        if self.parquet_path and os.path.exists(self.parquet_path):
+            os.remove(self.parquet_path)
+        if not os.path.exists(self.csv_path) or os.path.getsize(self.csv_path) == 0:
+            return None
+
+        # Un'interruzione durante la scrittura può lasciare l'ultima riga incompleta:
+        # il file viene troncato all'ultimo ritorno a capo.
+        with open(self.csv_path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - 65536))
+            tail = f.read()
+            if not tail.endswith(b'\n'):
+                f.truncate(size - len(tail) + tail.rfind(b'\n') + 1)
+
+        try:
+            frames = pd.read_csv(self.csv_path, usecols=['frame'])['frame']
+        except Exception as e:
+            print(f"ATTENZIONE: Impossibile leggere l'output esistente per la ripresa ({e}). Ricomincio da capo.")
+            os.remove(self.csv_path)
+            return None
+        if frames.empty:
+            return None
+        if self.parquet_path:
+            # Le righe già presenti nel CSV diventano i primi row group del nuovo Parquet
+            for chunk in pd.read_csv(self.csv_path, dtype=self.columns, chunksize=self.flush_every):
+                self._write_parquet(chunk)
+        self.rows_written = len(frames)
+        return int(frames.max())
+
+    def _write_parquet(self, chunk):
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if self._parquet_writer is None:
+            self._parquet_writer = pq.ParquetWriter(self.parquet_path, table.schema)
+        self._parquet_writer.write_table(table)
+
+    def append(self, row):
+        for name in self.columns:
+            self._buffers[name].append(row[name])
+        if len(self._buffers['frame']) >= self.flush_every:
+            self.flush()
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def flush(self):
+        n_rows = len(self._buffers['frame'])
+        if n_rows == 0:
+            return
+        chunk = pd.DataFrame({
+            name: pd.array(np.array(values, dtype=object if dtype in ('object', 'Int64') else dtype), dtype=dtype)
+            for (name, dtype), values in zip(self.columns.items(), self._buffers.values())
+        })
+        write_header = not os.path.exists(self.csv_path) or os.path.getsize(self.csv_path) == 0
+        chunk.to_csv(self.csv_path, mode='a', header=write_header, index=False)
+
+        if self.parquet_path:
+            self._write_parquet(chunk)
+
+        self.rows_written += n_rows
+        self.last_flushed_frame = int(chunk['frame'].iloc[-1])
+        self._buffers = {name: [] for name in self.columns}
+        if self.on_flush is not None:
+            self.on_flush(chunk)
+
+    def close(self):
+        self.flush()
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
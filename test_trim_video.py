@@ -0,0 +1,70 @@
+import contextlib
+import io
+import unittest
+
+import trim_video
+
+
+class FakeCapture:
+    """Video finto: il 'frame' letto è il suo stesso indice."""
+
+    def __init__(self, total_frames):
+        self.total_frames = total_frames
+
+    def isOpened(self):
+        return True
+
+    def read(self, frame_idx):
+        return frame_idx < self.total_frames, frame_idx
+
+
+def make_detector(visible_frames):
+    return lambda frames: [frame in visible_frames for frame in frames]
+
+
+class TestOnsetSearch(unittest.TestCase):
+    TOTAL_FRAMES = 1200
+    STOP_FRAME = 200
+    STRIDE = 30
+    TOLERANCE = 5
+
+    def find_both(self, visible_frames):
+        detector = make_detector(visible_frames)
+        with contextlib.redirect_stdout(io.StringIO()):
+            sequential, _ = trim_video.find_onset_sequential(
+                FakeCapture(self.TOTAL_FRAMES), self.TOTAL_FRAMES, self.STOP_FRAME, detector,
+                frame_tolerance=self.TOLERANCE)
+            coarse, _ = trim_video.find_onset_coarse_to_fine(
+                FakeCapture(self.TOTAL_FRAMES), self.TOTAL_FRAMES, self.STOP_FRAME, detector,
+                self.STRIDE, frame_tolerance=self.TOLERANCE)
+        return sequential, coarse
+
+    def test_dropout_at_confirmation_gap_after_grid_sample(self):
+        # Campione della griglia positivo, poi `frame_tolerance` frame persi dall'OCR
+        # e un breve tratto visibile che termina prima del campione successivo
+        grid_frame = 3 * self.STRIDE
+        resume = grid_frame + trim_video.confirmation_gap(self.TOLERANCE)
+        visible = {grid_frame} | set(range(resume, resume + 10))
+        sequential, coarse = self.find_both(visible)
+        self.assertEqual(sequential, resume + 10)
+        self.assertEqual(coarse, sequential)
+
+    def test_dropout_at_confirmation_gap_before_grid_sample(self):
+        # Caso simmetrico: il rilevamento isolato precede il campione positivo della griglia
+        grid_frame = 3 * self.STRIDE
+        isolated = grid_frame - trim_video.confirmation_gap(self.TOLERANCE)
+        visible = {isolated, grid_frame}
+        sequential, coarse = self.find_both(visible)
+        self.assertEqual(sequential, grid_frame + 1)
+        self.assertEqual(coarse, sequential)
+
+    def test_dropout_beyond_confirmation_gap_is_not_confirmed(self):
+        grid_frame = 3 * self.STRIDE
+        visible = {grid_frame, grid_frame + trim_video.confirmation_gap(self.TOLERANCE) + 1}
+        sequential, coarse = self.find_both(visible)
+        self.assertEqual(sequential, -1)
+        self.assertEqual(coarse, sequential)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import numpy as np
+
+
+def match_nearest_timestamps(left_ns, right_ns, tolerance_ns=None):
+    """
+    Per ogni timestamp di `left_ns` trova l'indice del timestamp più vicino in `right_ns`
+    (ordinato in modo crescente), lavorando direttamente su interi int64 in nanosecondi.
+
+    Replica la semantica di `pd.merge_asof(direction='nearest')`: a parità di distanza vince
+    il campione precedente, tra timestamp duplicati si usa l'ultimo, e la tolleranza è inclusiva.
+    Ritorna un array di indici in `right_ns`, con -1 dove non c'è alcun campione entro la tolleranza.
+    """
+    left_ns = np.asarray(left_ns, dtype=np.int64)
+    right_ns = np.asarray(right_ns, dtype=np.int64)
+    n_right = len(right_ns)
+    if n_right == 0:
+        return np.full(len(left_ns), -1, dtype=np.int64)
+
+    # Ultimo campione <= t (indietro) e primo campione >= t (avanti)
+    backward = np.searchsorted(right_ns, left_ns, side='right') - 1
+    forward = np.searchsorted(right_ns, left_ns, side='left')
+    has_backward = backward >= 0
+    has_forward = forward < n_right
+
+    max_dist = np.iinfo(np.int64).max
+    backward_dist = np.where(has_backward, left_ns - right_ns[np.clip(backward, 0, n_right - 1)], max_dist)
+    forward_dist = np.where(has_forward, right_ns[np.clip(forward, 0, n_right - 1)] - left_ns, max_dist)
+
+    use_forward = forward_dist < backward_dist
+    indices = np.where(use_forward, forward, backward)
+    distance = np.where(use_forward, forward_dist, backward_dist)
+
+    unmatched = ~(has_backward | has_forward)
+    if tolerance_ns is not None:
+        unmatched |= distance > tolerance_ns
+    indices[unmatched] = -1
+    return indices
@@ -1,5 +1,5 @@
 import cv2
-import easyocr
+import numpy as np
 import os
 import sys
 import csv
@@ -7,6 +7,15 @@ import tkinter as tk
 from tkinter import messagebox, ttk # Aggiunto ttk per lo slider
 from PIL import Image, ImageTk      # Aggiunto per gestire le immagini in Tkinter
 import concurrent.futures
+from video_utils import SequentialFrameReader
+import model_registry
+
+# Passo (in secondi) della griglia di campionamento nella ricerca "a grana grossa" del numero '1'
+ONSET_SEARCH_STRIDE_S = 0.5
+# Frame le cui ROI vengono riconosciute insieme in una sola chiamata OCR a batch
+OCR_BATCH_SIZE = 8
+# Scale provate per il modello della cifra disegnato (la dimensione reale del numero non è nota)
+RENDERED_TEMPLATE_SCALES = (0.5, 0.7, 1.0, 1.4, 2.0)
 
 # --- NUOVO: Selettore di frame interattivo con video ---
 # --- MODIFICA: La classe ora eredita da tk.Toplevel per una migliore integrazione ---
@@ -178,6 +187,11 @@ def select_frames_interactively_gui(parent, video_path):
         return {"fast": None, "slow": None, "cancelled": True}
 
 # --- Pipeline di pre-elaborazione OCR ---
+def extract_central_roi(frame):
+    """ROI centrale (metà larghezza e metà altezza) in cui compare il numero '1'."""
+    h, w, _ = frame.shape
+    return frame[int(h*0.25):int(h*0.75), int(w*0.25):int(w*0.75)]
+
 def preprocess_adaptive_gaussian(roi):
     gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
     blurred = cv2.GaussianBlur(gray, (5, 5), 0)
@@ -193,6 +207,137 @@ def preprocess_simple_binary_otsu(roi):
     _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
     return thresh
 
+# --- Filtro rapido prima dell'OCR ---
+class OcrPrefilter:
+    """
+    Filtro economico sulla ROI centrale che evita l'OCR (tre chiamate a `readtext` per frame)
+    quando non serve. Lavora su una versione ridotta in scala di grigi della ROI:
+      - se la ROI è praticamente uniforme (escursione dei grigi sotto `min_contrast`), o se la
+        binarizzazione adattiva (la stessa della prima pipeline) non produce alcuna componente
+        connessa alta almeno `min_component_height` volte la ROI, il frame non può contenere
+        una cifra e l'OCR viene saltato;
+      - se nessun pixel della ROI differisce dall'ultima analizzata con l'OCR di almeno
+        `change_threshold` livelli di grigio, si riusa l'ultimo risultato.
+    Tiene il conteggio dei frame inviati all'OCR e di quelli risparmiati.
+    """
+
+    def __init__(self, width=160, min_contrast=40, min_component_height=0.04, change_threshold=20):
+        self.width = width
+        self.min_contrast = min_contrast
+        self.min_component_height = min_component_height
+        self.change_threshold = change_threshold
+        self.last_roi = None
+        self.last_result = None
+        self.ocr_frames = 0
+        self.skipped_empty = 0
+        self.reused = 0
+
+    def _small_gray(self, roi):
+        gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+        height = max(1, round(gray.shape[0] * self.width / gray.shape[1]))
+        return cv2.resize(gray, (self.width, height), interpolation=cv2.INTER_AREA)
+
+    def _may_contain_text(self, small):
+        if int(small.max()) - int(small.min()) < self.min_contrast:
+            return False
+        binary = cv2.adaptiveThreshold(small, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 2)
+        _, _, stats, _ = cv2.connectedComponentsWithStats(binary)
+        heights = stats[1:, cv2.CC_STAT_HEIGHT]
+        return bool(((heights >= self.min_component_height * small.shape[0]) & (heights < small.shape[0])).any())
+
+    def check(self, roi):
+        """
+        Ritorna (esito, piccola ROI): esito è False/True se il risultato è già noto senza OCR,
+        None se il frame va analizzato (in tal caso chiamare poi `store` con il risultato).
+        """
+        small = self._small_gray(roi)
+        if self.last_roi is not None and self.last_roi.shape == small.shape and \
+                cv2.absdiff(small, self.last_roi).max() < self.change_threshold:
+            self.reused += 1
+            return self.last_result, small
+        if not self._may_contain_text(small):
+            self.skipped_empty += 1
+            return False, small
+        return None, small
+
+    def store(self, small, result):
+        self.ocr_frames += 1
+        self.last_roi = small
+        self.last_result = result
+
+    def stats_message(self):
+        saved = self.skipped_empty + self.reused
+        total = saved + self.ocr_frames
+        return (f"INFO: Filtro pre-OCR: {self.ocr_frames} frame analizzati con l'OCR su {total}, "
+                f"{saved} risparmiati ({self.skipped_empty} senza possibili cifre, {self.reused} invariati); "
+                f"{3 * saved} chiamate a readtext evitate.")
+
+# --- Rilevatore del numero '1' senza OCR ---
+def render_cue_glyph(frame_shape, text='1', font_scale=2, thickness=3):
+    """Frame nero con `text` bianco al centro, disegnato come il numero del video sintetico."""
+    frame = np.zeros(frame_shape, dtype=np.uint8)
+    text_size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)[0]
+    origin = ((frame_shape[1] - text_size[0]) // 2, (frame_shape[0] + text_size[1]) // 2)
+    cv2.putText(frame, text, origin, cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255), thickness)
+    return frame
+
+class TemplateCueDetector:
+    """
+    Rilevatore del numero '1' alternativo all'OCR: correlazione normalizzata
+    (`cv2.matchTemplate` con TM_CCOEFF_NORMED) tra la ROI centrale, ridotta a `roi_width` pixel
+    in scala di grigi, e un modello della cifra. Il numero è presente se la correlazione massima
+    con almeno uno dei modelli supera `threshold`.
+
+    Il modello si ricava da un frame in cui il numero è visibile (`from_frame`), scelto
+    dall'utente nella GUI. In alternativa viene disegnato alla risoluzione del video con
+    `render_cue_glyph` (`from_rendered_text`) e provato a più scale: questo modello corrisponde
+    al carattere del video sintetico e non è affidabile sulle registrazioni reali.
+    """
+
+    def __init__(self, templates, roi_width=240, threshold=0.7):
+        self.templates = templates
+        self.roi_width = roi_width
+        self.threshold = threshold
+
+    @staticmethod
+    def _work_gray(frame, roi_width):
+        gray = cv2.cvtColor(extract_central_roi(frame), cv2.COLOR_BGR2GRAY)
+        height = max(1, round(gray.shape[0] * roi_width / gray.shape[1]))
+        return cv2.resize(gray, (roi_width, height), interpolation=cv2.INTER_AREA)
+
+    @classmethod
+    def from_frame(cls, frame, roi_width=240, threshold=0.7, scales=(1.0,)):
+        """Ritaglia come modello la componente chiara più vicina al centro della ROI di `frame`."""
+        gray = cls._work_gray(frame, roi_width)
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+        n_labels, _, stats, centroids = cv2.connectedComponentsWithStats(binary)
+        if n_labels < 2:
+            raise ValueError("Nessuna cifra trovata nel frame scelto come modello.")
+        center = np.array([gray.shape[1], gray.shape[0]]) / 2
+        best = 1 + int(np.argmin(np.linalg.norm(centroids[1:] - center, axis=1)))
+        x, y, w, h = stats[best, :4]
+        # Un margine di sfondo attorno alla cifra rende la correlazione sensibile al contrasto
+        margin = max(2, h // 4)
+        template = gray[max(0, y - margin):y + h + margin, max(0, x - margin):x + w + margin]
+        templates = [cv2.resize(template, None, fx=s, fy=s, interpolation=cv2.INTER_AREA if s < 1 else cv2.INTER_LINEAR)
+                     for s in scales]
+        return cls(templates, roi_width, threshold)
+
+    @classmethod
+    def from_rendered_text(cls, frame_shape, text='1', roi_width=240, threshold=0.7):
+        """Modello disegnato come nel video sintetico, su un frame nero delle dimensioni indicate."""
+        return cls.from_frame(render_cue_glyph(frame_shape, text), roi_width, threshold, RENDERED_TEMPLATE_SCALES)
+
+    def detect(self, frame):
+        gray = self._work_gray(frame, self.roi_width)
+        for template in self.templates:
+            if template.shape[0] > gray.shape[0] or template.shape[1] > gray.shape[1]:
+                continue
+            _, max_score, _, _ = cv2.minMaxLoc(cv2.matchTemplate(gray, template, cv2.TM_CCOEFF_NORMED))
+            if max_score >= self.threshold:
+                return True
+        return False
+
 # --- Worker per l'esecuzione parallela dell'OCR ---
 def run_ocr_on_pipeline(args):
     """
@@ -202,8 +347,7 @@ def run_ocr_on_pipeline(args):
     frame, pipeline_func, reader, text_to_find = args
     try:
         # Estrai ROI
-        h, w, _ = frame.shape
-        roi = frame[int(h*0.25):int(h*0.75), int(w*0.25):int(w*0.75)]
+        roi = extract_central_roi(frame)
         
         # Applica pipeline
         processed_roi = pipeline_func(roi)
@@ -219,23 +363,33 @@ def run_ocr_on_pipeline(args):
         return False
 
 # --- Funzione che orchestra i thread paralleli per OCR ---
-def detect_text_ocr(frame, reader, text_to_find='1', executor=None):
+OCR_PIPELINES = [
+    preprocess_adaptive_gaussian,
+    preprocess_median_blur,
+    preprocess_simple_binary_otsu,
+]
+
+def detect_text_ocr(frame, reader, text_to_find='1', executor=None, prefilter=None):
     """
     Prova diverse pipeline in parallelo per massimizzare il rilevamento.
+    Con un `OcrPrefilter` l'OCR viene saltato sui frame che non possono contenere il testo
+    o la cui ROI non è cambiata dall'ultima analisi.
     """
+    if prefilter is not None:
+        known_result, small_roi = prefilter.check(extract_central_roi(frame))
+        if known_result is not None:
+            return known_result
+        result = detect_text_ocr(frame, reader, text_to_find, executor)
+        prefilter.store(small_roi, result)
+        return result
+
     if executor is None:
         # Esecuzione non parallela se non viene fornito un executor
         with concurrent.futures.ThreadPoolExecutor(max_workers=3) as ex:
             return detect_text_ocr(frame, reader, text_to_find, ex)
 
-    pipelines = [
-        preprocess_adaptive_gaussian,
-        preprocess_median_blur,
-        preprocess_simple_binary_otsu,
-    ]
-    
     # Crea un task per ogni pipeline
-    args_list = [(frame, p, reader, text_to_find) for p in pipelines]
+    args_list = [(frame, p, reader, text_to_find) for p in OCR_PIPELINES]
     
     # Esegue i task in parallelo
     results = executor.map(run_ocr_on_pipeline, args_list)
@@ -243,70 +397,258 @@ def detect_text_ocr(frame, reader, text_to_find='1', executor=None):
     # Ritorna True se ALMENO UNO dei risultati è True
     return any(results)
 
-def main(args):
-    print("\nFASE 1: Ricerca del punto di riferimento t0...")
-    if not os.path.exists(args.input_video):
-        raise FileNotFoundError(f"Video di input non trovato: {args.input_video}")
-
-    cap = cv2.VideoCapture(args.input_video)
-    if not cap.isOpened():
-        raise IOError(f"Errore: Impossibile aprire il video '{args.input_video}'")
-
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    if total_frames == 0:
-        raise ValueError("Errore: Impossibile leggere la durata del video.")
-    
-    stop_frame_threshold = total_frames // 6
-    print(f"Video di {total_frames} frame. Timeout automatico impostato al frame {stop_frame_threshold}.")
-
+def _readtext_or_empty(reader, image):
     try:
-        reader = easyocr.Reader(['en'], gpu=True)
-        print("EasyOCR inizializzato con GPU.")
-    except Exception:
-        print("GPU non disponibile per EasyOCR, ripiego su CPU (potrebbe essere più lento).")
-        reader = easyocr.Reader(['en'], gpu=False)
-
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    if fps == 0: raise ValueError("Errore: Impossibile leggere gli FPS del video.")
+        return reader.readtext(image, allowlist='0123456789', detail=0)
+    except Exception as e:
+        print(f"\nATTENZIONE: OCR non riuscito su un'immagine ({type(e).__name__}: {e}). Considerata senza testo.")
+        return []
 
+def detect_text_ocr_batch(frames, reader, text_to_find='1', prefilter=None):
+    """
+    Versione a batch di `detect_text_ocr`: le ROI di tutti i frame, pre-elaborate con tutte
+    le pipeline, vengono inviate a EasyOCR con una sola chiamata `readtext_batched`, che
+    esegue il rilevatore di testo sull'intero batch in un unico passaggio della rete invece
+    di una chiamata (in competizione per lo stesso modello) per ogni immagine.
+    Ritorna una lista di booleani, uno per frame.
+    """
+    results = [None] * len(frames)
+    pending, small_rois = [], {}
+    for i, frame in enumerate(frames):
+        roi = extract_central_roi(frame)
+        if prefilter is not None:
+            results[i], small_rois[i] = prefilter.check(roi)
+            if results[i] is not None:
+                continue
+        pending.append((i, roi))
+    if not pending:
+        return results
+
+    images = [pipeline(roi) for _, roi in pending for pipeline in OCR_PIPELINES]
+    texts = None
+    if hasattr(reader, 'readtext_batched'):
+        try:
+            # Senza batch_size il riconoscitore di EasyOCR elabora comunque un'immagine alla volta
+            texts = reader.readtext_batched(images, allowlist='0123456789', detail=0, batch_size=len(images))
+        except Exception as e:
+            print(f"\nATTENZIONE: OCR a batch non riuscito ({type(e).__name__}: {e}). Riconoscimento di un'immagine alla volta.")
+    if texts is None:
+        texts = [_readtext_or_empty(reader, image) for image in images]
+
+    n_pipelines = len(OCR_PIPELINES)
+    for k, (i, _) in enumerate(pending):
+        frame_texts = texts[k * n_pipelines:(k + 1) * n_pipelines]
+        results[i] = any(text_to_find in text for image_texts in frame_texts for text in image_texts)
+        if prefilter is not None:
+            prefilter.store(small_rois[i], results[i])
+    return results
+
+def confirmation_gap(frame_tolerance):
+    """Distanza massima tra due rilevamenti che si confermano a vicenda (al più `frame_tolerance` frame mancanti tra loro)."""
+    return frame_tolerance + 1
+
+def find_onset_sequential(cap, total_frames, stop_frame_threshold, detect_cues, batch_size=1,
+                          detection_goal=2, frame_tolerance=5):
+    """
+    Ricerca frame per frame: il numero '1' è confermato dopo `detection_goal` rilevamenti
+    con al più `frame_tolerance` frame mancanti tra uno e l'altro, e t0 è il primo frame successivo in cui scompare.
+    `detect_cues` riceve una lista di frame e ritorna un booleano per frame; i frame vengono
+    letti e analizzati a gruppi di `batch_size`.
+    Ritorna (t0, frame analizzati), con t0 = -1 se la ricerca fallisce.
+    """
     t0 = -1
     frame_number = 0
+    frames_checked = 0
     one_confirmed = False
-    detection_goal, frame_tolerance, detections_found, last_detection_frame = 2, 5, 0, -1
-    
-    print(f"Avvio ricerca automatica parallela...")
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret or (not one_confirmed and frame_number > stop_frame_threshold):
+    detections_found, last_detection_frame = 0, -1
+
+    while cap.isOpened():
+        # Prima della conferma non si leggono frame oltre il timeout
+        limit = batch_size if one_confirmed else min(batch_size, stop_frame_threshold + 1 - frame_number)
+        frames = []
+        while len(frames) < limit:
+            ret, frame = cap.read(frame_number + len(frames))
+            if not ret:
                 break
+            frames.append(frame)
+        if not frames:
+            break
 
+        for is_one_present in detect_cues(frames):
             if frame_number % 15 == 0:
                 print(f"Scansione in corso... Frame: {frame_number}/{total_frames}", end='\r')
-
-            is_one_present = detect_text_ocr(frame, reader, '1', executor)
+            frames_checked += 1
 
             if not one_confirmed:
                 if is_one_present:
-                    if last_detection_frame == -1 or (frame_number - last_detection_frame) > frame_tolerance + 1:
+                    if last_detection_frame == -1 or (frame_number - last_detection_frame) > confirmation_gap(frame_tolerance):
                         detections_found = 1
                     else:
                         detections_found += 1
                     last_detection_frame = frame_number
-                
+
                 if detections_found >= detection_goal:
                     one_confirmed = True
                     print(f"\n{' ' * 70}\rRilevamento del numero '1' confermato. Attesa della sua scomparsa...")
-            
+
             elif one_confirmed and not is_one_present:
                 t0 = frame_number
                 print(f"Punto di riferimento automatico trovato! t0 = frame {t0}")
-                break
-            
+                return t0, frames_checked
+
             frame_number += 1
 
+    return t0, frames_checked
+
+def find_onset_coarse_to_fine(cap, total_frames, stop_frame_threshold, detect_cues, stride, batch_size=1,
+                              frame_tolerance=5):
+    """
+    Ricerca a due livelli dello stesso t0 di `find_onset_sequential`, con molte meno chiamate OCR.
+
+    1. Campiona un frame ogni `stride` fino al timeout; un campione positivo è confermato da un
+       secondo rilevamento alla stessa distanza ammessa dalla ricerca frame per frame (prima o dopo).
+    2. Avanza con lo stesso passo finché il numero è visibile, poi cerca per bisezione, solo
+       nell'intervallo tra l'ultimo campione positivo e il primo negativo, il frame esatto di scomparsa.
+
+    I campioni della griglia e i passi in avanti vengono analizzati a gruppi di `batch_size`.
+    Presuppone che il numero resti visibile senza interruzioni per più di `stride` frame, come nelle
+    registrazioni del protocollo. Ritorna (t0, frame analizzati), con t0 = -1 se la ricerca fallisce.
+    """
+    checked = {}
+
+    def evaluate(frame_indices):
+        # Analizza in un'unica chiamata i frame non ancora esaminati (None = frame non leggibile)
+        frame_indices = sorted(set(frame_indices) - checked.keys())
+        readable, frames = [], []
+        for frame_idx in frame_indices:
+            ret, frame = cap.read(frame_idx)
+            checked[frame_idx] = None
+            if ret:
+                readable.append(frame_idx)
+                frames.append(frame)
+        if frames:
+            checked.update(zip(readable, detect_cues(frames)))
+
+    def present(frame_idx):
+        evaluate([frame_idx])
+        return checked[frame_idx]
+
+    # 1. Griglia sparsa fino alla conferma del numero '1'
+    # (come nella ricerca frame per frame, entrambi i rilevamenti devono cadere entro il timeout)
+    grid = list(range(0, stop_frame_threshold + 1, stride))
+    if grid[-1] != stop_frame_threshold:
+        grid.append(stop_frame_threshold)
+    last_present = None
+    for pos, frame_idx in enumerate(grid):
+        print(f"Scansione in corso... Frame: {frame_idx}/{total_frames}", end='\r')
+        if pos % batch_size == 0:
+            evaluate(grid[pos:pos + batch_size])
+        result = checked[frame_idx]
+        if result is None:
+            break
+        if not result:
+            continue
+        gap = confirmation_gap(frame_tolerance)
+        neighbours = [frame_idx + k for k in range(1, gap + 1) if frame_idx + k <= stop_frame_threshold]
+        neighbours += [frame_idx - k for k in range(1, gap + 1) if frame_idx - k >= 0]
+        if batch_size > 1:
+            evaluate(neighbours)
+        if any(present(j) for j in neighbours):
+            last_present = max(j for j in [frame_idx] + neighbours if checked.get(j))
+            break
+
+    if last_present is None:
+        return -1, len(checked)
+    print(f"\n{' ' * 70}\rRilevamento del numero '1' confermato. Attesa della sua scomparsa...")
+
+    # 2. Stesso passo in avanti finché il numero è visibile...
+    first_absent = last_present + stride
+    while True:
+        if first_absent not in checked:
+            evaluate(range(first_absent, first_absent + batch_size * stride, stride))
+        if not checked[first_absent]:
+            break
+        last_present, first_absent = first_absent, first_absent + stride
+
+    # ...poi bisezione sull'intervallo di confine (i frame oltre la fine del video contano come negativi)
+    while first_absent - last_present > 1:
+        mid = (last_present + first_absent) // 2
+        if present(mid):
+            last_present = mid
+        else:
+            first_absent = mid
+
+    if checked[first_absent] is None:
+        # Video terminato prima della scomparsa del numero
+        return -1, len(checked)
+    t0 = first_absent
+    print(f"Punto di riferimento automatico trovato! t0 = frame {t0}")
+    return t0, len(checked)
+
+def main(args):
+    print("\nFASE 1: Ricerca del punto di riferimento t0...")
+    if not os.path.exists(args.input_video):
+        raise FileNotFoundError(f"Video di input non trovato: {args.input_video}")
+
+    cap = SequentialFrameReader(args.input_video)
+    if not cap.isOpened():
+        raise IOError(f"Errore: Impossibile aprire il video '{args.input_video}'")
+
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if total_frames == 0:
+        raise ValueError("Errore: Impossibile leggere la durata del video.")
+    
+    stop_frame_threshold = total_frames // 6
+    print(f"Video di {total_frames} frame. Timeout automatico impostato al frame {stop_frame_threshold}.")
+
+    # Rilevatore del numero '1': EasyOCR ('ocr') o correlazione con un modello della cifra ('template')
+    cue_detector = getattr(args, 'cue_detector', 'ocr')
+    if cue_detector == 'template':
+        template_frame = getattr(args, 'cue_template_frame', None)
+        if template_frame is not None:
+            ret, frame = cap.read(int(template_frame))
+            if not ret:
+                raise ValueError(f"Errore: Impossibile leggere il frame {template_frame} scelto come modello della cifra.")
+            template_detector = TemplateCueDetector.from_frame(frame)
+            print(f"Rilevamento per modello: cifra ricavata dal frame {template_frame}.")
+        else:
+            frame_shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+            template_detector = TemplateCueDetector.from_rendered_text(frame_shape)
+            print("ATTENZIONE: Nessun frame scelto come modello: uso la cifra disegnata come nel video sintetico "
+                  "(non affidabile sulle registrazioni reali).")
+    else:
+        # Il lettore viene caricato una sola volta per processo e riusato dalle analisi successive
+        reader = model_registry.get_easyocr_reader(['en'])
+
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if fps == 0: raise ValueError("Errore: Impossibile leggere gli FPS del video.")
+
+    search_mode = getattr(args, 'onset_search', 'coarse')
+    prefilter = OcrPrefilter() if cue_detector == 'ocr' and getattr(args, 'ocr_prefilter', True) else None
+    print(f"Avvio ricerca automatica parallela...")
+
+    # Con batch_size > 1 le ROI di più frame vengono riconosciute con una sola chiamata a batch,
+    # altrimenti le tre pipeline di ogni frame sono distribuite sui thread dell'executor
+    # (il rilevatore per modello analizza sempre un frame alla volta)
+    batch_size = 1 if cue_detector == 'template' else max(1, int(getattr(args, 'ocr_batch_size', OCR_BATCH_SIZE)))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+        if cue_detector == 'template':
+            detect_cues = lambda frames: [template_detector.detect(frame) for frame in frames]
+        elif batch_size > 1:
+            detect_cues = lambda frames: detect_text_ocr_batch(frames, reader, '1', prefilter)
+        else:
+            detect_cues = lambda frames: [detect_text_ocr(frame, reader, '1', executor, prefilter) for frame in frames]
+        if search_mode == 'sequential':
+            t0, frames_checked = find_onset_sequential(cap, total_frames, stop_frame_threshold, detect_cues, batch_size)
+        else:
+            stride = max(1, int(round(getattr(args, 'onset_search_stride_s', ONSET_SEARCH_STRIDE_S) * fps)))
+            t0, frames_checked = find_onset_coarse_to_fine(cap, total_frames, stop_frame_threshold, detect_cues, stride, batch_size)
+
     print(" " * 70, end='\r')
+    print(f"INFO: Frame esaminati: {frames_checked} (modalità di ricerca '{search_mode}').")
+    if prefilter is not None:
+        print(prefilter.stats_message())
     cap.release()
 
     if t0 == -1:
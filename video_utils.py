@@ -0,0 +1,119 @@
+import cv2
+import numpy as np
+
+
+class SequentialFrameReader:
+    """
+    Lettore di frame che decodifica il video in avanti, in modo sequenziale.
+
+    Con i video H.264 (Pupil/Neon) ogni `cap.set(cv2.CAP_PROP_POS_FRAMES, ...)` obbliga
+    il decoder a ripartire dal keyframe precedente. Questo lettore esegue un seek solo
+    quando il frame richiesto è "indietro" rispetto alla posizione corrente o troppo
+    lontano in avanti; per i piccoli salti avanza con `grab()` senza convertire i frame.
+    """
+
+    def __init__(self, video_path, max_forward_gap=30):
+        self.video_path = video_path
+        self.max_forward_gap = max_forward_gap
+        self.cap = cv2.VideoCapture(video_path)
+        self.next_frame = 0  # Indice del frame restituito dalla prossima cap.read() (None = ignoto)
+        self.seek_count = 0
+        self.grab_count = 0
+        self.read_count = 0
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def get(self, prop_id):
+        return self.cap.get(prop_id)
+
+    def read(self, frame_idx):
+        """Restituisce (ret, frame) per il frame `frame_idx`, evitando seek non necessari."""
+        gap = frame_idx - self.next_frame if self.next_frame is not None else -1
+        if gap < 0 or gap > self.max_forward_gap:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+            self.seek_count += 1
+        else:
+            # Piccolo salto in avanti: scartiamo i frame intermedi senza decodificarli in BGR
+            for _ in range(gap):
+                if not self.cap.grab():
+                    self.next_frame = None
+                    return False, None
+                self.grab_count += 1
+
+        ret, frame = self.cap.read()
+        if ret:
+            self.next_frame = frame_idx + 1
+            self.read_count += 1
+        else:
+            # Posizione del decoder non più affidabile: il prossimo accesso farà un seek
+            self.next_frame = None
+        return ret, frame
+
+    def release(self):
+        self.cap.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class HomographyCache:
+    """
+    Cache della trasformazione prospettica per una superficie (quasi) statica.
+
+    La matrice di omografia viene ricalcolata solo quando gli angoli della superficie si
+    spostano oltre `tolerance_px` rispetto agli angoli usati per l'ultimo calcolo; altrimenti
+    si riusa la matrice (e, se `use_remap` è attivo, le tabelle di remap pre-calcolate,
+    che evitano di rivalutare l'omografia per ogni pixel).
+    """
+
+    def __init__(self, output_size, tolerance_px=0.5, use_remap=False):
+        self.output_width, self.output_height = output_size
+        self.tolerance_px = tolerance_px
+        self.use_remap = use_remap
+        self.dst_pts = np.array([[0, 0], [self.output_width - 1, 0],
+                                 [self.output_width - 1, self.output_height - 1],
+                                 [0, self.output_height - 1]], dtype=np.float32)
+        self.ref_pts = None
+        self.matrix = None
+        self.maps = None
+        self.hits = 0
+        self.misses = 0
+
+    def _update(self, src_pts):
+        self.ref_pts = np.array(src_pts, dtype=np.float32)
+        self.matrix = cv2.getPerspectiveTransform(self.ref_pts, self.dst_pts)
+        self.maps = None
+        if self.use_remap:
+            # Per ogni pixel di output, la sua posizione nel frame originale (omografia inversa)
+            inv = np.linalg.inv(self.matrix)
+            xs, ys = np.meshgrid(np.arange(self.output_width, dtype=np.float64),
+                                 np.arange(self.output_height, dtype=np.float64))
+            den = inv[2, 0] * xs + inv[2, 1] * ys + inv[2, 2]
+            map_x = ((inv[0, 0] * xs + inv[0, 1] * ys + inv[0, 2]) / den).astype(np.float32)
+            map_y = ((inv[1, 0] * xs + inv[1, 1] * ys + inv[1, 2]) / den).astype(np.float32)
+            self.maps = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+
+    def warp(self, frame, src_pts):
+        """Raddrizza `frame` usando gli angoli `src_pts` (tl, tr, br, bl)."""
+        if self.ref_pts is not None and np.abs(src_pts - self.ref_pts).max() <= self.tolerance_px:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self._update(src_pts)
+
+        if self.maps is not None:
+            return cv2.remap(frame, self.maps[0], self.maps[1], cv2.INTER_LINEAR)
+        return cv2.warpPerspective(frame, self.matrix, (self.output_width, self.output_height))
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats_message(self, label):
+        return (f"INFO: Cache omografia '{label}': {self.hit_rate * 100:.1f}% di riuso "
+                f"({self.hits} riusi, {self.misses} ricalcoli).")